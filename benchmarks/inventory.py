@@ -0,0 +1,101 @@
+"""
+Flash-sale checkout contention benchmark.
+
+Several threads check out one unit of the same product at a time, each in
+its own transaction that stays open for `--hold-ms` after the stock is taken
+(standing in for the rest of PlaceOrderView: order rows, cart cleanup,
+outbox). The product is measured first with its single `stock` row, then
+with its stock split over `--shards` StockShard rows.
+
+    python benchmarks/inventory.py --threads 16 --checkouts 2000 --shards 16
+
+Needs PostgreSQL (DATABASE_URL): SQLite has no row locks to contend on.
+Runs against a throwaway test database created from the configured DATABASES.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment
+
+from products.inventory import set_stock, take_stock
+from products.models import Product
+
+
+def checkout(product_id, count, hold):
+    """Take one unit `count` times; return per-checkout latencies."""
+    product = Product.objects.get(pk=product_id)
+    latencies = []
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            with transaction.atomic():
+                take_stock([(product, 1)])
+                time.sleep(hold)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+    return latencies
+
+
+def run(product_id, shards, threads, checkouts, hold):
+    set_stock(product_id, quantity=checkouts, shards=shards)
+    per_thread = checkouts // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(checkout, product_id, per_thread, hold) for _ in range(threads)]
+        latencies = [latency for future in futures for latency in future.result()]
+    elapsed = time.perf_counter() - start
+    assert Product.objects.get(pk=product_id).available_stock == checkouts - per_thread * threads
+    return {
+        "checkouts/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p95 ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--checkouts", type=int, default=1600)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--hold-ms", type=float, default=5.0, help="Time each checkout keeps its transaction open")
+    args = parser.parse_args()
+
+    if connection.vendor != "postgresql":
+        sys.exit("This benchmark needs PostgreSQL; SQLite serializes all writers anyway.")
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        product = Product.objects.create(name="Flash sale item", price=Decimal("9.99"))
+        hold = args.hold_ms / 1000
+        results = {
+            "single row": run(product.pk, 0, args.threads, args.checkouts, hold),
+            f"{args.shards} shards": run(product.pk, args.shards, args.threads, args.checkouts, hold),
+        }
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    columns = list(next(iter(results.values())))
+    print(f"{'mode':<12}" + "".join(f"{column:>13}" for column in columns))
+    for mode, row in results.items():
+        print(f"{mode:<12}" + "".join(f"{row[column]:13.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Login throughput benchmark.
+
+Sends concurrent JWT logins (POST /api/v1/users/login/) from several threads,
+first with hashing inline on the request threads (PASSWORD_HASH_WORKERS=0),
+then through the hashing pool. It reports logins per second and latency,
+plus how many cheap catalog reads a parallel thread completed in the same
+window, which shows how much logins starve browsing.
+
+    python benchmarks/login.py --threads 8 --logins 200 --workers 2
+
+Runs against a throwaway test database created from the configured DATABASES.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+
+from users.models import CustomUser
+
+
+CREDENTIALS = {"username": "bench", "password": "bench-pass-123"}
+
+
+def login(_):
+    client = Client()
+    start = time.perf_counter()
+    response = client.post("/api/v1/users/login/", CREDENTIALS)
+    assert response.status_code == 200, response.content
+    return time.perf_counter() - start
+
+
+def browse(stop, counter):
+    """Catalog reads while logins are running."""
+    client = Client()
+    while not stop.is_set():
+        client.get("/api/v1/categories/")
+        counter[0] += 1
+
+
+def run(workers, threads, logins):
+    with override_settings(PASSWORD_HASH_WORKERS=workers, ALLOWED_HOSTS=["testserver"]):
+        login(None)  # warm up (starts the pool)
+        stop, reads = threading.Event(), [0]
+        browser = threading.Thread(target=browse, args=(stop, reads))
+        browser.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = list(executor.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        browser.join()
+    return {
+        "logins/s": logins / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p95 ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+        "reads/s": reads[0] / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2, help="Hashing processes for the pooled run")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        CustomUser.objects.create_user(**CREDENTIALS)
+        results = {
+            "inline": run(0, args.threads, args.logins),
+            f"pool({args.workers})": run(args.workers, args.threads, args.logins),
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    columns = list(next(iter(results.values())))
+    print(f"{'mode':<10}" + "".join(f"{column:>11}" for column in columns))
+    for mode, row in results.items():
+        print(f"{mode:<10}" + "".join(f"{row[column]:11.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
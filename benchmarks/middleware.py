@@ -0,0 +1,86 @@
+"""
+Middleware overhead benchmark.
+
+Times a trivial view (no database, no serializer) through three stacks:
+
+  legacy     all session/CSRF/auth/message middleware in MIDDLEWARE, API path
+  scoped     current MIDDLEWARE, API path (BROWSER_MIDDLEWARE skipped)
+  browser    current MIDDLEWARE, non-API path (BROWSER_MIDDLEWARE runs)
+
+    python benchmarks/middleware.py --requests 20000
+
+Needs the same environment as the app (SECRET_KEY, DATABASE_URL); no
+database connection is opened.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import Client, override_settings
+from django.urls import path
+
+
+def ping(request):
+    return HttpResponse(b"pong", content_type="text/plain")
+
+
+urlpatterns = [
+    path("api/v1/ping/", ping),
+    path("ping/", ping),
+]
+
+
+def legacy_middleware():
+    """The stack before path scoping: browser middleware inlined in MIDDLEWARE."""
+    stack = []
+    for middleware in settings.MIDDLEWARE:
+        if middleware == "core.middleware.BrowserMiddleware":
+            stack += settings.BROWSER_MIDDLEWARE
+        else:
+            stack.append(middleware)
+    return stack
+
+
+def run(middleware, url, requests):
+    """Return microseconds per request for `url` through `middleware`."""
+    with override_settings(ROOT_URLCONF=__name__, MIDDLEWARE=middleware, ALLOWED_HOSTS=["testserver"]):
+        client = Client()
+        assert client.get(url).status_code == 200
+        for _ in range(min(requests // 10, 1000)):  # warm up
+            client.get(url)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(url)
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = {
+        "legacy": run(legacy_middleware(), "/api/v1/ping/", args.requests),
+        "scoped": run(settings.MIDDLEWARE, "/api/v1/ping/", args.requests),
+        "browser": run(settings.MIDDLEWARE, "/ping/", args.requests),
+    }
+    print(f"{'stack':<10} {'us/request':>11}   ({args.requests} requests)")
+    for name, micros in results.items():
+        print(f"{name:<10} {micros:11.1f}")
+    saved = results["legacy"] - results["scoped"]
+    print(f"API requests save {saved:.1f} us ({saved / results['legacy']:.0%}) of middleware + client overhead")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Cart and order totalling benchmark.
+
+Totals in-memory carts and orders (no database) and renders the line and
+basket totals to JSON, two ways:
+
+  decimal    the previous Decimal arithmetic (price * quantity, summed)
+  money      the Money properties on CartItem, Cart and OrderItem, rendered
+             through MoneyField
+
+Both must produce byte-identical JSON.
+
+    python benchmarks/money.py --carts 2000 --items 8
+
+Needs the same environment as the app (SECRET_KEY, DATABASE_URL); no
+database connection is opened.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer
+
+from core.money import MoneyField, total
+from orders.models import CartItem, Order, OrderItem
+from products.models import Product
+
+
+def build(carts, items, seed=0):
+    """Return (carts as lists of CartItems, orders with prefetched OrderItems) sharing random prices."""
+    rng = random.Random(seed)
+    products = [
+        Product(pk=pk, name=f"Product {pk}", price=Decimal(rng.randint(99, 99999)).scaleb(-2), stock=10)
+        for pk in range(1, 501)
+    ]
+    cart_lines, orders = [], []
+    for number in range(carts):
+        lines = [CartItem(product=rng.choice(products), quantity=rng.randint(1, 5)) for _ in range(items)]
+        cart_lines.append(lines)
+
+        order = Order(pk=number + 1, total_price=Decimal("0.00"))
+        order._prefetched_objects_cache = {"items": [
+            OrderItem(pk=index, order=order, quantity=line.quantity, price=line.product.price,
+                      product_name=line.product.name)
+            for index, line in enumerate(lines)
+        ]}
+        orders.append(order)
+    return cart_lines, orders
+
+
+def decimal_totals(cart_lines, orders):
+    carts = []
+    for lines in cart_lines:
+        line_totals = [line.product.price * line.quantity for line in lines]
+        carts.append({"lines": line_totals, "total": sum(line_totals)})
+    order_lines = [[item.quantity * item.price for item in order.items.all()] for order in orders]
+    return JSONRenderer().render({"carts": carts, "orders": order_lines})
+
+
+def money_totals(cart_lines, orders):
+    field = MoneyField()
+    carts = []
+    for lines in cart_lines:
+        line_totals = [line.total_price for line in lines]
+        carts.append({
+            "lines": [field.to_representation(amount) for amount in line_totals],
+            "total": field.to_representation(total(line_totals)),
+        })
+    order_lines = [[field.to_representation(item.total_price) for item in order.items.all()] for order in orders]
+    return JSONRenderer().render({"carts": carts, "orders": order_lines})
+
+
+def timed(func, *args, repeat=5):
+    """Best wall time of `repeat` runs, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--carts", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=8, help="Lines per cart / order")
+    args = parser.parse_args()
+
+    cart_lines, orders = build(args.carts, args.items)
+    decimal_time, expected = timed(decimal_totals, cart_lines, orders)
+    money_time, actual = timed(money_totals, cart_lines, orders)
+    assert actual == expected, "Money output differs from the Decimal output"
+
+    lines = args.carts * args.items * 2
+    print(f"{'mode':<10} {'ms':>8} {'ns/line':>9}   ({args.carts} carts + orders x {args.items} lines, JSON included)")
+    for name, seconds in (("decimal", decimal_time), ("money", money_time)):
+        print(f"{name:<10} {seconds * 1000:8.1f} {seconds / lines * 1e9:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
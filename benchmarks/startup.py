@@ -0,0 +1,98 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the settings,
+populate the app registry and load the URLconf.
+
+Each sample runs in a new interpreter so nothing is cached in-process:
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --importtime   # per-module breakdown (slowest first)
+
+Needs the same environment as the app (SECRET_KEY, DATABASE_URL); no
+database connection is opened.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in the child interpreter; prints one JSON line of phase timings (seconds)
+PROBE = """
+import json, time
+start = time.perf_counter()
+import config.settings
+settings_done = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_done = time.perf_counter()
+print(json.dumps({
+    "settings": settings_done - start,
+    "django.setup": setup_done - settings_done,
+    "urlconf": urls_done - setup_done,
+    "total": urls_done - start,
+}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def sample():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=child_env(),
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def importtime(top):
+    """Print the `top` slowest modules by cumulative import time."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE], cwd=ROOT, env=child_env(),
+        check=True, capture_output=True, text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        self_us, cumulative_us, module = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        rows.append((int(cumulative_us), int(self_us), module))
+    rows.sort(reverse=True)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, module in rows[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports instead")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    if args.importtime:
+        importtime(args.top)
+        return
+
+    samples = [sample() for _ in range(args.runs)]
+    print(f"{'phase':<14} {'median ms':>10} {'min ms':>8} {'max ms':>8}   ({args.runs} runs)")
+    for phase in samples[0]:
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:<14} {statistics.median(values):10.1f} {min(values):8.1f} {max(values):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Gunicorn server profile.
+
+Run with `gunicorn -c config/gunicorn.py`. Everything is tuned from the
+environment so one image serves every deployment size:
+
+  GUNICORN_WORKER_CLASS   sync | gthread | uvicorn        (default: gthread)
+  GUNICORN_WORKERS        explicit worker count            (default: derived from CPUs)
+  GUNICORN_MAX_WORKERS    upper bound for the derived count (default: 12)
+  GUNICORN_THREADS        threads per gthread worker       (default: 4)
+  GUNICORN_PRELOAD        load the app once in the master  (default: true)
+  GUNICORN_MAX_REQUESTS   recycle a worker after N requests (default: 1000, 0 disables)
+  GUNICORN_MEMORY_REPORT_EVERY  log worker RSS every N requests (default: 500, 0 disables)
+
+With `preload_app` the master imports Django before forking, so workers share
+the imported code pages copy-on-write and boot faster. Nothing in the app
+opens sockets at import time (DB connections, the payment gateway session and
+the log listener are all created lazily per process), so this is fork-safe.
+"""
+import os
+import resource
+import sys
+
+
+def _env_int(name, default):
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name, "").strip().lower()
+    return value in ("1", "true", "yes", "on") if value else default
+
+
+def cpu_count():
+    """CPUs this process may actually run on (respects container CPU sets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "uvicorn": "uvicorn_worker.UvicornWorker",
+}
+
+
+def default_workers(kind, cpus):
+    """
+    Sync workers block on I/O, so use the classic 2 * CPUs + 1. Threaded and
+    async workers overlap I/O inside the process, so one per CPU (+1) is enough.
+    """
+    if kind == "sync":
+        return 2 * cpus + 1
+    if kind == "gthread":
+        return cpus + 1
+    return cpus
+
+
+worker_kind = os.environ.get("GUNICORN_WORKER_CLASS", "gthread").strip().lower()
+if worker_kind not in WORKER_CLASSES:
+    raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = WORKER_CLASSES[worker_kind]
+workers = _env_int(
+    "GUNICORN_WORKERS",
+    min(default_workers(worker_kind, cpu_count()), _env_int("GUNICORN_MAX_WORKERS", 12)),
+)
+threads = _env_int("GUNICORN_THREADS", 4) if worker_kind == "gthread" else 1
+
+# The uvicorn worker needs the ASGI entry point; the others serve WSGI
+wsgi_app = "config.asgi:application" if worker_kind == "uvicorn" else "config.wsgi:application"
+
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+# Recycle workers periodically to cap slow leaks; jitter avoids all workers restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max(max_requests // 10, 0))
+
+# Keep-alive must stay below the load balancer's idle timeout, or it may reuse a socket we just closed
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Heartbeat files on tmpfs; the container's /tmp may be disk-backed overlayfs
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+memory_report_every = _env_int("GUNICORN_MEMORY_REPORT_EVERY", 500)
+
+
+def max_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def when_ready(server):
+    server.log.info(
+        "Serving with %d %s worker(s), %d thread(s) each, preload=%s, max RSS %.1f MiB",
+        workers, worker_class, threads, preload_app, max_rss_mb()
+    )
+
+
+def post_worker_init(worker):
+    worker.requests_handled = 0
+    worker.log.info("Worker %s booted, max RSS %.1f MiB", worker.pid, max_rss_mb())
+
+
+def post_request(worker, req, environ, resp):
+    if not memory_report_every:
+        return
+    worker.requests_handled = getattr(worker, "requests_handled", 0) + 1
+    if worker.requests_handled % memory_report_every == 0:
+        worker.log.info(
+            "Worker %s handled %d requests, max RSS %.1f MiB",
+            worker.pid, worker.requests_handled, max_rss_mb()
+        )
+
+
+def worker_exit(server, worker):
+    # Runs in the exiting worker, so the RSS is the worker's own
+    server.log.info(
+        "Worker %s exiting after %d requests, max RSS %.1f MiB",
+        worker.pid, getattr(worker, "requests_handled", 0), max_rss_mb()
+    )
@@ -0,0 +1,177 @@
+"""
+Structured, non-blocking logging.
+
+Records are put on an in-memory queue by the request thread and written as
+JSON lines to stdout by a background `QueueListener`, so slow log sinks never
+stall a request. Every record carries the current request id; views add
+`user_id`, `order_id`, `payment_id`, ... through `extra`.
+
+Success logs on hot paths are sampled: pass `extra={"sample": True}` and only
+`LOG_SUCCESS_SAMPLE_RATE` of them are kept. Warnings and errors are never sampled.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+
+# Request id of the request being handled by the current thread/task
+request_id_var = ContextVar("request_id", default=None)
+
+# Attributes copied from `extra` into the JSON record when present
+CONTEXT_FIELDS = ("user_id", "order_id", "payment_id", "product_id", "stripe_event_type")
+
+
+class RequestIDMiddleware:
+    """
+    Assigns each request an id (reusing an incoming X-Request-ID) and echoes it back.
+
+    The id stays set until `request_finished`, so it is still there when
+    Django's handler logs 4xx/5xx responses after the middleware returned.
+    """
+
+    header = "X-Request-ID"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(self.header) or uuid.uuid4().hex
+        request.request_id = request_id
+        request_id_var.set(request_id)
+        response = self.get_response(request)
+        response[self.header] = request_id
+        return response
+
+
+@receiver(request_finished)
+def clear_request_id(**kwargs):
+    request_id_var.set(None)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the request id on every record (django.request records carry their request)."""
+
+    def filter(self, record):
+        request = getattr(record, "request", None)
+        record.request_id = getattr(request, "request_id", None) or request_id_var.get()
+        return True
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps only `rate` of the records logged with `extra={"sample": True}`."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Renders a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler that owns its listener thread and writes JSON to stdout.
+
+    The queue is bounded; when it is full, records are dropped instead of
+    blocking the caller. `dropped` counts them, and once there is room again
+    a warning reports how many were lost. The listener is started lazily per
+    process, so it also works when gunicorn forks workers from a preloaded app.
+    """
+
+    def __init__(self, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = logging.StreamHandler(sys.stdout)
+        self.target.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self._unreported = 0
+        self._dropped_lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start_listener(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._listener.stop)
+
+    def prepare(self, record):
+        # Resolve lazy pieces on the caller's thread; JSON encoding happens on the listener
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                self._unreported += 1
+            return
+        if self._unreported:
+            self.report_dropped()
+
+    def report_dropped(self):
+        with self._dropped_lock:
+            count, self._unreported = self._unreported, 0
+        if not count:
+            return
+        notice = logging.makeLogRecord({
+            "name": __name__,
+            "levelno": logging.WARNING,
+            "levelname": "WARNING",
+            "msg": f"Dropped {count} log records: the log queue was full ({self.dropped} since start)",
+            "request_id": request_id_var.get(),
+        })
+        try:
+            self.queue.put_nowait(notice)
+        except queue.Full:
+            with self._dropped_lock:
+                self._unreported += count
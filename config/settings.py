@@ -47,18 +47,36 @@ INSTALLED_APPS = [
     "django_filters",
     'orders',
     'drf_spectacular',
+    'core',
 ]
 
 MIDDLEWARE = [
+    'config.log.RequestIDMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Runs BROWSER_MIDDLEWARE, except for STATELESS_PATH_PREFIXES (see core/middleware.py)
+    'core.middleware.BrowserMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Session-based middleware, needed by the admin and browsable pages only
+BROWSER_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 503 instead of 500 when the password hashing pool is saturated (DRF views do this themselves)
+    'users.hashing.HashingBusyMiddleware',
 ]
 
+# JWT-authenticated routes that skip BROWSER_MIDDLEWARE
+STATELESS_PATH_PREFIXES = ['/api/v1/']
+
+# The admin checks look for its middleware in MIDDLEWARE only; core.checks verifies BROWSER_MIDDLEWARE instead
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -87,6 +105,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Cart read model: serialized carts kept in the cache, rebuilt on every cart write
+CART_CACHE_ENABLED = env.bool('CART_CACHE_ENABLED', default=False)
+CART_CACHE_ALIAS = env('CART_CACHE_ALIAS', default='default')
+CART_CACHE_TIMEOUT = env.int('CART_CACHE_TIMEOUT', default=24 * 60 * 60)
+
+# Seconds the category listing and tree stay cached (writes invalidate them early)
+CATEGORY_CACHE_TIMEOUT = env.int('CATEGORY_CACHE_TIMEOUT', default=60 * 60)
+
+# Per-product cache used by the batch lookup endpoint, and its maximum batch size
+PRODUCT_CACHE_TIMEOUT = env.int('PRODUCT_CACHE_TIMEOUT', default=15 * 60)
+PRODUCT_BATCH_MAX_IDS = env.int('PRODUCT_BATCH_MAX_IDS', default=200)
+
+# Counter rows per flash-sale product (`manage.py shard_stock <id>`), i.e. parallel checkouts of it
+STOCK_SHARDS = env.int('STOCK_SHARDS', default=16)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -106,6 +147,53 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing: the first hasher is used for new hashes; older ones are upgraded on login
+PASSWORD_HASHERS = env.list('PASSWORD_HASHERS', default=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+])
+
+# Password checks run in a per-process hashing pool (see users/hashing.py)
+AUTHENTICATION_BACKENDS = ['users.backends.PooledHashingBackend']
+# Hashing processes per web worker (0 hashes inline on the request thread)
+PASSWORD_HASH_WORKERS = env.int('PASSWORD_HASH_WORKERS', default=2)
+# Hashes queued or running at once per web worker (0: unbounded); more get a 503 after PASSWORD_HASH_QUEUE_TIMEOUT seconds
+PASSWORD_HASH_MAX_PENDING = env.int('PASSWORD_HASH_MAX_PENDING', default=16)
+PASSWORD_HASH_QUEUE_TIMEOUT = env.float('PASSWORD_HASH_QUEUE_TIMEOUT', default=0.5)
+PASSWORD_HASH_START_METHOD = env('PASSWORD_HASH_START_METHOD', default='forkserver')
+
+
+# Logging
+# JSON lines on stdout, written by a background queue listener (see config/log.py)
+
+LOG_LEVEL = env('LOG_LEVEL', default='INFO')
+# Fraction of high-volume success logs (extra={"sample": True}) that are kept
+LOG_SUCCESS_SAMPLE_RATE = env.float('LOG_SUCCESS_SAMPLE_RATE', default=0.1)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'config.log.RequestContextFilter'},
+        'sample_success': {'()': 'config.log.SuccessSampler', 'rate': LOG_SUCCESS_SAMPLE_RATE},
+    },
+    'handlers': {
+        'json_queue': {
+            'class': 'config.log.QueueListenerHandler',
+            'filters': ['request_context', 'sample_success'],
+            'maxsize': 10000,
+        },
+    },
+    'root': {
+        'handlers': ['json_queue'],
+        'level': LOG_LEVEL,
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -124,6 +212,23 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Response compression (brotli when installed, else gzip); smaller bodies are sent as-is
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)
+# How long compressed variants of catalog responses stay cached (seconds)
+COMPRESSION_CACHE_TIMEOUT = env.int('COMPRESSION_CACHE_TIMEOUT', default=60 * 60)
+
+# Request profiling (see core/profiling.py): staff may send `X-Profile: 1`;
+# a sample rate > 0 also profiles that fraction of all requests
+PROFILING_ALLOW_HEADER = env.bool('PROFILING_ALLOW_HEADER', default=True)
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+# Number of most recent profiles kept
+PROFILING_BUFFER_SIZE = env.int('PROFILING_BUFFER_SIZE', default=50)
+
+# Release identifier (e.g. the git SHA set by CI); keys the pre-generated OpenAPI schema
+DEPLOY_VERSION = env('DEPLOY_VERSION', default='')
+# Where `generate_schema` writes the schema artifacts served at /api/schema/
+SCHEMA_CACHE_DIR = env('SCHEMA_CACHE_DIR', default=str(STATIC_ROOT / 'schema'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -146,4 +251,38 @@ REST_FRAMEWORK = {
 # Stripe Configuration
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY')
-STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
\ No newline at end of file
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+
+# Payment gateway (see orders/gateways.py); orders.gateways.FakeGateway works offline
+PAYMENT_GATEWAY = env('PAYMENT_GATEWAY', default='orders.gateways.StripeGateway')
+PAYMENT_GATEWAY_OPTIONS = {}
+STRIPE_CONNECT_TIMEOUT = env.float('STRIPE_CONNECT_TIMEOUT', default=3.05)
+STRIPE_READ_TIMEOUT = env.float('STRIPE_READ_TIMEOUT', default=10.0)
+STRIPE_POOL_MAXSIZE = env.int('STRIPE_POOL_MAXSIZE', default=10)
+STRIPE_MAX_NETWORK_RETRIES = env.int('STRIPE_MAX_NETWORK_RETRIES', default=1)
+# Circuit breaker: open after this many consecutive failures, retry after the reset window
+STRIPE_BREAKER_FAILURES = env.int('STRIPE_BREAKER_FAILURES', default=5)
+STRIPE_BREAKER_RESET_SECONDS = env.float('STRIPE_BREAKER_RESET_SECONDS', default=30.0)
+
+# Reaper (`manage.py reap_stale`) thresholds
+CART_IDLE_DAYS = env.int('CART_IDLE_DAYS', default=30)
+PENDING_ORDER_TTL_HOURS = env.int('PENDING_ORDER_TTL_HOURS', default=48)
+REAPER_BATCH_SIZE = env.int('REAPER_BATCH_SIZE', default=500)
+
+# How long stored responses for Idempotency-Key retries are kept
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', default=24)
+
+# Transactional outbox relay (`manage.py relay_outbox`)
+OUTBOX_SINK = env('OUTBOX_SINK', default='orders.outbox.LogSink')
+OUTBOX_SINK_OPTIONS = {}
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+# Failed publishes after which an event is dead-lettered (failed_at set) instead of blocking the queue
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=5)
+
+# Finished orders older than this are moved to the archive tables (`manage.py archive_orders`)
+ORDER_ARCHIVE_AFTER_DAYS = env.int('ORDER_ARCHIVE_AFTER_DAYS', default=365)
+
+# "Frequently bought together" (`manage.py build_recommendations`): neighbours kept per product
+RECOMMENDATIONS_TOP_K = env.int('RECOMMENDATIONS_TOP_K', default=10)
+# Outbox events older than this are assumed committed or rolled back: no lower id can still appear
+RECOMMENDATIONS_SETTLE_SECONDS = env.int('RECOMMENDATIONS_SETTLE_SECONDS', default=300)
@@ -0,0 +1,56 @@
+"""
+Helpers shared by the app test suites.
+
+`QueryCountScalingMixin` guards endpoints against N+1 regressions: the same
+request is replayed against fixtures of increasing size and must issue the
+same number of SQL queries every time.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+# Row counts each endpoint is exercised with
+QUERY_COUNT_SCALES = (1, 10, 100)
+
+
+class QueryCountScalingMixin:
+    """
+    Mixin for `TestCase` subclasses.
+
+    `build(scale)` creates the fixtures for one scale and returns whatever
+    `call` needs; `call(fixtures)` performs the request and returns the
+    response. Each scale runs inside its own savepoint, which is rolled back
+    afterwards, so scales never see each other's rows. The cache is cleared
+    before every scale so each request does its full amount of work.
+    """
+    query_count_scales = QUERY_COUNT_SCALES
+
+    def capture_scaled_queries(self, build, call):
+        """Return {scale: [captured query dicts]} for every configured scale."""
+        captured = {}
+        for scale in self.query_count_scales:
+            cache.clear()
+            with transaction.atomic():
+                fixtures = build(scale)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = call(fixtures)
+                self.assertLess(
+                    response.status_code, 400,
+                    f"Request failed at scale {scale}: {getattr(response, 'data', response)}"
+                )
+                captured[scale] = ctx.captured_queries
+                transaction.set_rollback(True)
+        return captured
+
+    def assertConstantQueries(self, build, call):
+        """Fail with the offending SQL if the query count varies across scales."""
+        captured = self.capture_scaled_queries(build, call)
+        counts = {scale: len(queries) for scale, queries in captured.items()}
+        if len(set(counts.values())) == 1:
+            return
+
+        largest = max(captured)
+        lines = [f"Query count grows with row count: {counts}", f"Queries at scale {largest}:"]
+        lines += [f"  {i}. {query['sql']}" for i, query in enumerate(captured[largest], start=1)]
+        self.fail("\n".join(lines))
@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Middleware the admin needs (its own checks admin.E408-E410 are silenced in settings)
+ADMIN_MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+)
+
+
+@register(Tags.admin)
+def check_browser_middleware(app_configs, **kwargs):
+    """The admin must still get its middleware, either directly or through BrowserMiddleware."""
+    if not apps.is_installed('django.contrib.admin'):
+        return []
+    available = list(settings.MIDDLEWARE)
+    if 'core.middleware.BrowserMiddleware' in available:
+        available += getattr(settings, 'BROWSER_MIDDLEWARE', [])
+    return [
+        Error(f"'{path}' must be in MIDDLEWARE or BROWSER_MIDDLEWARE to use the admin.", id='core.E001')
+        for path in ADMIN_MIDDLEWARE
+        if path not in available
+    ]
@@ -0,0 +1,121 @@
+"""
+Response compression.
+
+`CompressionMiddleware` negotiates brotli (when the optional `brotli` package
+is installed) or gzip from Accept-Encoding and compresses JSON (API and
+schema) bodies of at least `COMPRESSION_MIN_SIZE` bytes returned to GET/HEAD.
+
+HTML is deliberately left alone. Admin and browsable-API pages carry CSRF
+tokens next to attacker-influenced text, which is exactly what BREACH
+recovers through compressed sizes. The JSON API authenticates with bearer
+headers rather than cookies and embeds no such tokens.
+
+Views serving shared, cacheable content (the catalog) mark their response
+with `cache_compressed(response)`. The compressed bytes are then stored in
+the cache, keyed by a digest of the uncompressed body, so a popular page is
+compressed once at a high level and every later identical body is a cache
+lookup. Content-addressed keys need no invalidation: a changed page simply
+hashes to a new entry.
+"""
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional dependency; gzip is always available
+    brotli = None
+
+
+# API payloads only; see the module docstring for why text/html is not on the list
+COMPRESSIBLE_TYPES = ("application/json", "application/vnd.oai.openapi")
+
+# (per-request level, cached level): cached variants are compressed once, so spend more CPU on them
+LEVELS = {"br": (4, 11), "gzip": (6, 9)}
+
+
+def cache_compressed(response):
+    """Mark `response` as shared content whose compressed variants may be cached."""
+    response.cache_compressed = True
+    return response
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header with a non-zero q-value."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        match = re.search(r"q=([0-9.]+)", params)
+        if name and (match is None or float(match.group(1)) > 0):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, level):
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compresses eligible responses with brotli or gzip; see the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD") or not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        body = response.content
+        if getattr(response, "cache_compressed", False):
+            compressed = self.cached_variant(body, encoding)
+        else:
+            compressed = compress(body, encoding, LEVELS[encoding][0])
+        if len(compressed) >= len(body):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The body differs from the identity representation, so a strong ETag would be wrong
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
+
+    def is_compressible(self, response):
+        return (
+            not response.streaming
+            and response.status_code == 200
+            and not response.has_header("Content-Encoding")
+            and response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES)
+            and len(response.content) >= settings.COMPRESSION_MIN_SIZE
+        )
+
+    def cached_variant(self, body, encoding):
+        key = f"compressed:{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}"
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding, LEVELS[encoding][1])
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+        return compressed
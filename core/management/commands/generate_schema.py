@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.schema import generate_artifacts, schema_version
+
+
+class Command(BaseCommand):
+    help = "Pre-generate the OpenAPI schema artifacts served at /api/schema/ (run once per deploy)."
+
+    def handle(self, *args, **options):
+        paths = generate_artifacts()
+        for path in paths:
+            self.stdout.write(f"  {path}")
+        self.stdout.write(self.style.SUCCESS(f"Generated schema version {schema_version()}."))
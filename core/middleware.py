@@ -0,0 +1,67 @@
+"""
+Path-scoped middleware.
+
+Stateless JWT routes (`STATELESS_PATH_PREFIXES`, i.e. /api/v1/) never use
+sessions, CSRF cookies, messages or `request.user` from the session: DRF
+authenticates them itself. `BrowserMiddleware` runs the middleware listed in
+`BROWSER_MIDDLEWARE` only for the other paths (admin, Swagger UI), so API
+requests skip that work entirely.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+class BrowserMiddleware:
+    """
+    Builds its own chain from `BROWSER_MIDDLEWARE`, the same way Django builds
+    the main one, and forwards `process_view` / `process_exception` to it,
+    since Django only calls those hooks on middleware listed in `MIDDLEWARE`.
+    Synchronous only, like the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.stateless_prefixes = tuple(settings.STATELESS_PATH_PREFIXES)
+        self.view_hooks = []
+        self.exception_hooks = []
+
+        handler = get_response
+        for middleware_path in reversed(settings.BROWSER_MIDDLEWARE):
+            try:
+                instance = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, "process_view"):
+                self.view_hooks.insert(0, instance.process_view)
+            if hasattr(instance, "process_exception"):
+                self.exception_hooks.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.browser_chain = handler
+
+    def is_stateless(self, request):
+        return request.path_info.startswith(self.stateless_prefixes)
+
+    def __call__(self, request):
+        if self.is_stateless(request):
+            return self.get_response(request)
+        return self.browser_chain(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_stateless(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        if self.is_stateless(request):
+            return None
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
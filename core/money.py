@@ -0,0 +1,144 @@
+"""
+Money as integer minor units.
+
+Prices are stored in `DecimalField(max_digits=10, decimal_places=2)` columns,
+but cart, order and payment code works with `Money`: whole cents in an int,
+so line and basket totals are integer arithmetic and the cents Stripe wants
+are just `.cents`. Conversion to and from Decimal is exact and refuses
+fractions of a cent rather than rounding them away.
+
+Serializers expose computed amounts through `MoneyField`. It renders the
+same JSON number the API has always returned for them, as a float built from
+the cents, which the JSON encoder writes natively instead of falling back to
+its Python-level Decimal handling.
+
+Per line, the work is kept to int operations. Arguments are checked once, at
+the boundary (the public constructor and `from_decimal`). Arithmetic builds
+its results through an unchecked constructor, and Decimal-to-cents
+conversions are memoised, because a basket's prices come from a small
+catalog and repeat.
+"""
+import functools
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import serializers
+
+
+# Decimal amounts whose cents are memoised (least recently used are evicted)
+CENTS_CACHE_SIZE = 4096
+
+
+def _money(cents):
+    """Money from int `cents`, skipping the constructor's type check (for results of int arithmetic)."""
+    money = object.__new__(Money)
+    money.cents = cents
+    return money
+
+
+@functools.total_ordering
+class Money:
+    """An amount in cents (single currency, like the rest of the shop). Treat as immutable."""
+
+    __slots__ = ("cents",)
+
+    def __init__(self, cents=0):
+        if type(cents) is not int:
+            raise TypeError(f"Money takes integer cents, not {type(cents).__name__}")
+        self.cents = cents
+
+    @classmethod
+    def from_decimal(cls, value):
+        """Exact conversion from a Decimal (or int/str) amount; fractions of a cent raise ValueError."""
+        return _money(to_cents(value))
+
+    def to_decimal(self):
+        """The amount as a two-place Decimal, ready for a DecimalField column."""
+        return Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return _money(self.cents + other.cents)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # Lets sum() start from its default 0
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return _money(self.cents - other.cents)
+        return NotImplemented
+
+    def __mul__(self, quantity):
+        if type(quantity) is int:
+            return _money(self.cents * quantity)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return _money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+@functools.lru_cache(maxsize=CENTS_CACHE_SIZE)
+def to_cents(value):
+    """Exact int cents of a Decimal (or int/str) amount; fractions of a cent raise ValueError."""
+    if type(value) is not Decimal:
+        try:
+            value = Decimal(value)
+        except InvalidOperation as e:
+            raise ValueError(f"{value!r} is not a decimal amount") from e
+    if not value.is_finite():
+        raise ValueError(f"{value} is not a finite amount")
+    scaled = value * 100
+    cents = int(scaled)
+    if cents != scaled:
+        raise ValueError(f"{value} is not a whole number of cents")
+    return cents
+
+
+def line_total(price, quantity):
+    """`quantity` units at the Decimal `price`, as Money (one int multiplication, one object)."""
+    return _money(to_cents(price) * quantity)
+
+
+def total(amounts):
+    """Sum Money amounts as plain ints (no intermediate Money objects)."""
+    return _money(sum(amount.cents for amount in amounts))
+
+
+class MoneyField(serializers.ReadOnlyField):
+    """
+    Read-only Money, rendered as the JSON number these fields have always had.
+    Int / 100 is correctly rounded, so it equals float(Decimal) of the same amount.
+    """
+
+    def to_representation(self, value):
+        return value.cents / 100
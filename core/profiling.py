@@ -0,0 +1,130 @@
+"""
+On-demand request profiling.
+
+A request is profiled when a staff user sends `X-Profile: 1` (and
+`PROFILING_ALLOW_HEADER` is on), or when it falls in the random
+`PROFILING_SAMPLE_RATE` sample. A profiled request runs under cProfile with
+its SQL captured. The result goes into a ring buffer of the last
+`PROFILING_BUFFER_SIZE` profiles, kept in the shared cache so every worker's
+profiles are visible. Staff browse them at /admin/profiles/. The response
+carries `X-Profile-Id`.
+
+Requests that are not profiled pay for one header lookup (plus one random()
+call when sampling is on).
+"""
+import cProfile
+import io
+import pstats
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from config.log import request_id_var
+
+
+SEQUENCE_KEY = "profiling:sequence"
+# Caps on what one profile may store
+MAX_QUERIES = 200
+MAX_STATS_LINES = 60
+
+
+def entry_key(slot):
+    return f"profiling:entry:{slot}"
+
+
+def _jwt_user(request):
+    """The user of a JWT-authenticated API request (session middleware is skipped there)."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (InvalidToken, TokenError):
+        return None
+    return result[0] if result else None
+
+
+def requested_by_staff(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        user = _jwt_user(request)
+    return bool(user and user.is_staff)
+
+
+def store_profile(entry):
+    """Append `entry` to the ring buffer and return its id."""
+    try:
+        profile_id = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        profile_id = cache.incr(SEQUENCE_KEY)
+    entry["id"] = profile_id
+    # Slots are reused modulo the buffer size, so the buffer never grows
+    cache.set(entry_key(profile_id % settings.PROFILING_BUFFER_SIZE), entry, timeout=None)
+    return profile_id
+
+
+def recent_profiles():
+    """Stored profiles, newest first."""
+    entries = cache.get_many([entry_key(slot) for slot in range(settings.PROFILING_BUFFER_SIZE)])
+    return sorted(entries.values(), key=lambda entry: entry["id"], reverse=True)
+
+
+def get_profile(profile_id):
+    entry = cache.get(entry_key(profile_id % settings.PROFILING_BUFFER_SIZE))
+    return entry if entry and entry["id"] == profile_id else None
+
+
+class ProfilingMiddleware:
+    """Profiles opted-in or sampled requests; see the module docstring."""
+
+    header = "X-Profile"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        if settings.PROFILING_ALLOW_HEADER and request.headers.get(self.header) == "1":
+            return requested_by_staff(request)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats("cumulative").print_stats(MAX_STATS_LINES)
+        captured = queries.captured_queries
+        user = getattr(request, "user", None)
+
+        profile_id = store_profile({
+            "timestamp": timezone.now(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "request_id": request_id_var.get(),
+            "user": str(user) if user is not None and user.is_authenticated else None,
+            "query_count": len(captured),
+            "sql_ms": round(sum(float(query["time"]) for query in captured) * 1000, 2),
+            "queries": captured[:MAX_QUERIES],
+            "stats": stats_output.getvalue(),
+        })
+        response["X-Profile-Id"] = str(profile_id)
+        return response
@@ -0,0 +1,113 @@
+"""
+Pre-generated OpenAPI schema.
+
+Generating the schema introspects every view and serializer, so it is done
+once per deploy (`manage.py generate_schema`, or lazily on the first request)
+and written to `SCHEMA_CACHE_DIR` as JSON and YAML, each with a gzipped copy.
+Artifacts are keyed by `schema_version()`: `DEPLOY_VERSION` when the deploy
+sets it, otherwise a hash of the project's source files, so a new release
+never serves a stale schema.
+"""
+import functools
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import drf_spectacular
+from django.conf import settings
+
+
+FORMATS = {
+    "json": "application/vnd.oai.openapi+json",
+    "yaml": "application/vnd.oai.openapi",
+}
+
+SchemaArtifact = namedtuple("SchemaArtifact", ["body", "gzipped", "etag", "content_type"])
+
+# Loaded artifacts per (version, format); the schema never changes within a process
+_artifacts = {}
+_lock = threading.Lock()
+
+
+@functools.cache
+def schema_version():
+    """DEPLOY_VERSION if set, else a hash of the project's Python sources."""
+    if settings.DEPLOY_VERSION:
+        return settings.DEPLOY_VERSION
+
+    digest = hashlib.sha256(drf_spectacular.__version__.encode())
+    base_dir = Path(settings.BASE_DIR)
+    for path in sorted(base_dir.rglob("*.py")):
+        relative = path.relative_to(base_dir)
+        if relative.parts[0].startswith((".", "venv")) or "migrations" in relative.parts:
+            continue
+        digest.update(str(relative).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _artifact_path(version, fmt):
+    return Path(settings.SCHEMA_CACHE_DIR) / f"schema-{version}.{fmt}"
+
+
+def _write_atomic(path, data):
+    """Write via a temp file + rename so concurrent workers never read a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def render_schema():
+    """Generate the public schema and return {format: bytes}."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    return {
+        "json": OpenApiJsonRenderer().render(schema, renderer_context={}),
+        "yaml": OpenApiYamlRenderer().render(schema, renderer_context={}),
+    }
+
+
+def generate_artifacts(version=None):
+    """Render the schema and write plain + gzipped artifacts; return the paths written."""
+    version = version or schema_version()
+    written = []
+    for fmt, body in render_schema().items():
+        path = _artifact_path(version, fmt)
+        _write_atomic(path, body)
+        _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+        written += [path, path.with_name(path.name + ".gz")]
+    return written
+
+
+def get_artifact(fmt):
+    """Return the SchemaArtifact for `fmt`, generating it on first use."""
+    version = schema_version()
+    key = (version, fmt)
+    artifact = _artifacts.get(key)
+    if artifact is not None:
+        return artifact
+
+    with _lock:
+        if key not in _artifacts:
+            path = _artifact_path(version, fmt)
+            gz_path = path.with_name(path.name + ".gz")
+            if not (path.exists() and gz_path.exists()):
+                generate_artifacts(version)
+            body = path.read_bytes()
+            etag = f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+            _artifacts[key] = SchemaArtifact(body, gz_path.read_bytes(), etag, FORMATS[fmt])
+        return _artifacts[key]
+
+
+def clear_loaded_artifacts():
+    """Forget in-process copies (tests, or after regenerating in a long-lived shell)."""
+    _artifacts.clear()
+    schema_version.cache_clear()
@@ -0,0 +1,178 @@
+"""
+Sparse fieldsets for read endpoints.
+
+    ?fields=id,name,price                   only these attributes
+    ?fields=id,category.name                dotted paths pick nested attributes
+    ?fields=id,category&expand=category     a nested object named in `fields`
+                                            renders as its id unless expanded
+
+Without `fields` the full representation is returned, as before.
+
+`SparseFieldsetMixin` prunes the view's serializers accordingly, and
+`sparse_paths()` reports the model lookups the pruned serializer reads, so
+views can `only()` those columns; `restrict_queryset()` does that for forward
+relations. Serializers declare what computed fields read with
+`Meta.sparse_dependencies = {"field": ["lookup", ...]}`.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.functional import cached_property
+from rest_framework import serializers
+
+
+def parse_paths(raw):
+    """
+    Turn "id,category.name,category.slug" into {"id": None, "category": {"name": None, "slug": None}}.
+    None means "the whole field".
+    """
+    tree = {}
+    for path in (raw or "").split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break  # the whole field was already requested
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _nested_serializer(field):
+    """The serializer behind a nested field (unwrapping many=True), or None."""
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def prune_serializer(serializer, fields, expand, path=""):
+    """Drop fields not in `fields` (None keeps all) and collapse unexpanded nested objects to ids."""
+    serializer = _nested_serializer(serializer) or serializer
+    if fields is not None:
+        unknown = [name for name in fields if name not in serializer.fields or serializer.fields[name].write_only]
+        if unknown:
+            raise serializers.ValidationError({"fields": [f"Unknown field: {path}{name}" for name in unknown]})
+        for name in list(serializer.fields):
+            if name not in fields:
+                serializer.fields.pop(name)
+
+    for name, field in list(serializer.fields.items()):
+        nested = _nested_serializer(field)
+        if nested is None:
+            continue
+        subfields = fields.get(name) if fields is not None else None
+        if fields is not None and subfields is None and name not in expand:
+            kwargs = {"source": field.source} if field.source != name else {}
+            serializer.fields[name] = serializers.PrimaryKeyRelatedField(
+                read_only=True, many=isinstance(field, serializers.ListSerializer), **kwargs
+            )
+        else:
+            prune_serializer(nested, subfields, expand.get(name) or {}, path=f"{path}{name}.")
+    return serializer
+
+
+def prune_representation(data, fields, expand):
+    """Apply the same pruning to already serialized data (e.g. a cached full representation)."""
+    if isinstance(data, list):
+        return [prune_representation(item, fields, expand) for item in data]
+    if fields is None or not isinstance(data, dict):
+        return data
+
+    pruned = {}
+    for name, value in data.items():
+        if name not in fields:
+            continue
+        is_object = isinstance(value, dict) or (isinstance(value, list) and value and isinstance(value[0], dict))
+        if is_object and fields[name] is None and name not in expand:
+            value = [item["id"] for item in value] if isinstance(value, list) else value["id"]
+        elif is_object:
+            value = prune_representation(value, fields[name], expand.get(name) or {})
+        pruned[name] = value
+    return pruned
+
+
+def model_paths(serializer, prefix=""):
+    """Model lookups ("name", "category__slug", "items__quantity") read by a (pruned) serializer."""
+    serializer = _nested_serializer(serializer) or serializer
+    model = serializer.Meta.model
+    dependencies = getattr(serializer.Meta, "sparse_dependencies", {})
+
+    paths = set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in dependencies:
+            paths.update(prefix + lookup for lookup in dependencies[name])
+            continue
+        if not field.source_attrs:
+            continue
+        try:
+            source = model._meta.get_field(field.source_attrs[0]).name
+        except FieldDoesNotExist:
+            continue
+        paths.add(prefix + source)
+        nested = _nested_serializer(field)
+        if nested is not None:
+            paths |= model_paths(nested, prefix=f"{prefix}{source}__")
+    return paths
+
+
+def nested_paths(paths, relation):
+    """Paths below `relation`, with the prefix stripped."""
+    prefix = f"{relation}__"
+    return {path[len(prefix):] for path in paths if path.startswith(prefix)}
+
+
+def restrict_queryset(queryset, paths):
+    """
+    `only()` the forward columns in `paths` and `select_related()` exactly the
+    forward relations they traverse. Reverse relations are left to the caller
+    (see `nested_paths`), usually as a `Prefetch` with its own restriction.
+    """
+    columns, relations = set(), set()
+    for path in paths:
+        model, parts = queryset.model, path.split("__")
+        for depth, part in enumerate(parts):
+            field = model._meta.get_field(part)
+            if not field.concrete or field.many_to_many:
+                break  # reverse or m2m relation
+            if depth == len(parts) - 1:
+                columns.add(path)
+            elif field.is_relation:
+                relations.add("__".join(parts[:depth + 1]))
+                model = field.related_model
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns, *relations)
+
+
+class SparseFieldsetMixin:
+    """
+    For generic views: applies `?fields=` / `?expand=` to every serializer
+    from `get_serializer()` on safe requests.
+    """
+
+    @cached_property
+    def fieldset(self):
+        """(fields, expand) parsed from the query string, or None for a full representation."""
+        request = self.request
+        if request.method not in ("GET", "HEAD") or not request.query_params.get("fields"):
+            return None
+        return parse_paths(request.query_params["fields"]), parse_paths(request.query_params.get("expand"))
+
+    def apply_fieldset(self, serializer):
+        if self.fieldset is not None:
+            prune_serializer(serializer, *self.fieldset)
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        return self.apply_fieldset(super().get_serializer(*args, **kwargs))
+
+    def sparse_paths(self):
+        """Model lookups needed for the requested fields, or None when everything is requested."""
+        if self.fieldset is None:
+            return None
+        serializer_class = self.get_serializer_class()
+        return model_paths(self.apply_fieldset(serializer_class(context=self.get_serializer_context())))
@@ -0,0 +1,228 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.log import QueueListenerHandler, RequestContextFilter
+from products.models import Category
+from . import compression
+from .checks import check_browser_middleware
+from .money import Money, MoneyField, line_total, total
+from .profiling import get_profile, recent_profiles
+from .schema import clear_loaded_artifacts
+
+
+class CachedSchemaTests(TestCase):
+    """The schema is generated once per deploy version and served with an ETag."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        overrides = override_settings(SCHEMA_CACHE_DIR=self.cache_dir.name, DEPLOY_VERSION="test-1")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        clear_loaded_artifacts()
+        self.addCleanup(clear_loaded_artifacts)
+        self.url = reverse("schema")
+
+    def test_serves_json_and_revalidates_with_etag(self):
+        response = self.client.get(self.url, {"format": "json"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("/api/v1/products/", json.loads(response.content)["paths"])
+        self.assertTrue(response["ETag"].startswith('"test-1-'))
+
+        response = self.client.get(self.url, {"format": "json"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_variant_is_precompressed(self):
+        with tempfile.TemporaryFile(mode="w+") as output:
+            call_command("generate_schema", stdout=output)
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(compressed["ETag"], "W/" + plain["ETag"])
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        revalidated = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=compressed["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+        refused = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertFalse(refused.has_header("Content-Encoding"))
+        self.assertEqual(refused.content, plain.content)
+
+    def test_new_deploy_version_changes_etag(self):
+        first = self.client.get(self.url)["ETag"]
+        with self.settings(DEPLOY_VERSION="test-2"):
+            clear_loaded_artifacts()
+            self.assertNotEqual(self.client.get(self.url)["ETag"], first)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionTests(TestCase):
+    """Catalog responses are compressed, and their compressed variants cached."""
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.bulk_create([Category(name=f"Category {i}", slug=f"category-{i}") for i in range(30)])
+        self.url = reverse("category-list")
+
+    def test_gzip_is_negotiated(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=1.0, identity;q=0.5")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+    def test_refused_encodings_and_small_bodies_are_left_alone(self):
+        self.assertFalse(self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0").has_header("Content-Encoding"))
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            self.assertFalse(self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip").has_header("Content-Encoding"))
+
+    def test_html_pages_are_never_compressed(self):
+        # BREACH: admin pages mix CSRF tokens with reflected input
+        response = self.client.get(reverse("admin:login"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertGreaterEqual(len(response.content), 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_catalog_variant_is_compressed_once(self):
+        with mock.patch("core.compression.compress", wraps=compression.compress) as compress:
+            for _ in range(3):
+                self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compress.call_count, 1)
+
+
+class BrowserMiddlewareTests(TestCase):
+    """Session, CSRF, auth and message middleware only run outside /api/v1/."""
+
+    def test_api_requests_skip_session_machinery(self):
+        response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(hasattr(response.wsgi_request, "session"))
+        self.assertFalse(hasattr(response.wsgi_request, "_messages"))
+
+    def test_admin_keeps_sessions_and_csrf(self):
+        response = self.client.get(reverse("admin:login"))
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertTrue(hasattr(response.wsgi_request, "session"))
+
+        csrf_client = Client(enforce_csrf_checks=True)
+        self.assertEqual(csrf_client.post(reverse("admin:login"), {"username": "x"}).status_code, 403)
+
+    def test_check_requires_admin_middleware_somewhere(self):
+        self.assertEqual(check_browser_middleware(None), [])
+        with self.settings(BROWSER_MIDDLEWARE=["django.middleware.csrf.CsrfViewMiddleware"]):
+            self.assertEqual({error.id for error in check_browser_middleware(None)}, {"core.E001"})
+
+
+class ProfilingTests(TestCase):
+    """Staff can profile single requests; profiles land in a bounded ring buffer."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.staff = User.objects.create_user(username="ops", password="x", is_staff=True)
+        self.customer = User.objects.create_user(username="customer", password="x")
+        self.url = reverse("category-list")
+
+    def bearer(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}", "HTTP_X_PROFILE": "1"}
+
+    def test_staff_header_profiles_api_request(self):
+        response = self.client.get(self.url, **self.bearer(self.staff))
+        profile = get_profile(int(response["X-Profile-Id"]))
+        self.assertEqual(profile["path"], self.url)
+        self.assertEqual(profile["query_count"], len(profile["queries"]))
+        self.assertIn("cumulative", profile["stats"])
+
+    def test_header_from_non_staff_is_ignored(self):
+        self.assertFalse(self.client.get(self.url, **self.bearer(self.customer)).has_header("X-Profile-Id"))
+        self.assertFalse(self.client.get(self.url, HTTP_X_PROFILE="1").has_header("X-Profile-Id"))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_BUFFER_SIZE=3)
+    def test_ring_buffer_keeps_newest(self):
+        for _ in range(5):
+            self.client.get(self.url)
+        self.assertEqual([profile["id"] for profile in recent_profiles()], [5, 4, 3])
+        self.assertIsNone(get_profile(1))
+
+    def test_admin_pages(self):
+        profile_id = int(self.client.get(self.url, **self.bearer(self.staff))["X-Profile-Id"])
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse("profile-list")), self.url)
+        self.assertContains(self.client.get(reverse("profile-detail", args=[profile_id])), "SELECT")
+
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse("profile-list")).status_code, 302)
+
+
+class MoneyTests(TestCase):
+    """Money converts exactly to and from the two-place Decimal columns."""
+
+    def test_round_trips_decimal_columns(self):
+        for value in ("0.00", "0.29", "19.99", "12345678.90", "-4.10"):
+            amount = Money.from_decimal(Decimal(value))
+            self.assertEqual(amount.to_decimal(), Decimal(value))
+            self.assertEqual(str(amount.to_decimal()), value)
+        self.assertEqual(Money.from_decimal(Decimal("0.29")).cents, 29)
+        self.assertEqual(Money.from_decimal(Decimal("1.1")).cents, 110)
+
+    def test_refuses_fractions_of_a_cent(self):
+        for _ in range(2):  # refusals are never memoised
+            with self.assertRaises(ValueError):
+                Money.from_decimal(Decimal("0.005"))
+        for value in ("12,50", "", "Infinity", Decimal("NaN")):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                Money.from_decimal(value)
+        with self.assertRaises(TypeError):
+            Money(1.5)
+
+    def test_arithmetic_stays_in_cents(self):
+        lines = [Money.from_decimal(Decimal("19.99")) * 3, Money(1)]
+        self.assertEqual(total(lines), Money(5998))
+        self.assertEqual(sum(lines), Money(5998))
+        self.assertEqual(total([]), Money())
+        self.assertEqual(line_total(Decimal("19.99"), 3), Money(5997))
+        self.assertLess(Money(1), Money(2))
+
+    def test_field_renders_the_previous_json_number(self):
+        for value in ("0.10", "0.29", "59.97", "99999999.99"):
+            amount = Money.from_decimal(Decimal(value))
+            self.assertEqual(MoneyField().to_representation(amount), float(Decimal(value)))
+
+
+class RequestLoggingTests(TestCase):
+    """Request ids reach Django's own response logging; dropped records are reported."""
+
+    def test_error_responses_are_logged_with_the_request_id(self):
+        with self.assertLogs("django.request", level="WARNING") as logs:
+            self.client.get("/api/v1/products/999999/", headers={"X-Request-ID": "req-404"})
+        record = logs.records[0]
+        RequestContextFilter().filter(record)
+        self.assertEqual(record.request_id, "req-404")
+
+    def test_dropped_records_are_reported(self):
+        handler = QueueListenerHandler(maxsize=2)
+        handler._pid = os.getpid()  # keep the listener thread out of it
+        for number in range(3):
+            handler.enqueue(logging.makeLogRecord({"msg": f"record {number}"}))
+        self.assertEqual(handler.dropped, 1)
+
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.enqueue(logging.makeLogRecord({"msg": "record 3"}))
+
+        messages = [handler.queue.get_nowait().getMessage() for _ in range(2)]
+        self.assertEqual(messages[0], "record 3")
+        self.assertIn("Dropped 1 log records", messages[1])
+
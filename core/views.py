@@ -0,0 +1,75 @@
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.generic import TemplateView
+from drf_spectacular.views import SpectacularAPIView
+
+from .compression import accepted_encodings
+from .profiling import get_profile, recent_profiles
+from .schema import FORMATS, get_artifact
+
+
+class CachedSchemaView(View):
+    """
+    Serves the pre-generated OpenAPI schema as a static artifact.
+
+    GET /api/schema/            (YAML, or JSON when the Accept header asks for it)
+    GET /api/schema/?format=json
+    Supports If-None-Match and serves the gzipped copy to clients that accept it.
+    Requests for a specific ?lang= or ?version= fall back to live generation.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("lang") or request.GET.get("version"):
+            return SpectacularAPIView.as_view()(request, *args, **kwargs)
+
+        fmt = request.GET.get("format")
+        if fmt not in FORMATS:
+            fmt = "json" if "json" in request.headers.get("Accept", "") else "yaml"
+        artifact = get_artifact(fmt)
+        gzipped = bool(accepted_encodings(request.headers.get("Accept-Encoding", "")) & {"gzip", "*"})
+        # The gzip body differs from the identity one, so it gets a weak ETag (as in GZipMiddleware)
+        etag = "W/" + artifact.etag if gzipped else artifact.etag
+
+        # If-None-Match uses the weak comparison: either variant's tag revalidates
+        if artifact.etag in {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}:
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(artifact.gzipped, content_type=artifact.content_type)
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(artifact.body, content_type=artifact.content_type)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, no-cache"
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class ProfileListView(TemplateView):
+    """GET /admin/profiles/ - the profiles in the ring buffer, newest first."""
+    template_name = "admin/profiles/list.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(admin.site.each_context(self.request), title="Request profiles", profiles=recent_profiles())
+        return context
+
+
+@method_decorator(staff_member_required, name="dispatch")
+class ProfileDetailView(TemplateView):
+    """GET /admin/profiles/<id>/ - cProfile statistics and SQL of one request."""
+    template_name = "admin/profiles/detail.html"
+
+    def get_context_data(self, **kwargs):
+        profile = get_profile(kwargs["profile_id"])
+        if profile is None:
+            raise Http404("Profile not found (it may have been overwritten).")
+        context = super().get_context_data(**kwargs)
+        context.update(admin.site.each_context(self.request), title=f"Profile #{profile['id']}", profile=profile)
+        return context
@@ -1,21 +1,26 @@
 from django.contrib import admin
+
+from core.admin import IdInputFilter, LargeTableAdminMixin
 from .models import Order, OrderItem, Payment, Cart, CartItem
+from .models import ArchivedOrder, ArchivedOrderItem
 
 
 class OrderItemInline(admin.TabularInline):
     """Inline configuration to display OrderItems inside the Order detail page."""
     model = OrderItem
     extra = 0  # No empty rows by default
-    readonly_fields = ("product", "price", "quantity")  # These should not be editable
+    readonly_fields = ("product", "product_name", "price", "quantity")  # These should not be editable
     can_delete = False  # Prevent accidental deletion
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin configuration for the Order model."""
     list_display = ("id", "user", "status", "total_price", "created_at")
+    list_select_related = ("user",)
     list_filter = ("status", "created_at")
-    search_fields = ("id", "user__username")
+    # Numeric terms match the order id exactly (see LargeTableAdminMixin)
+    search_fields = ("user__username__exact",)
     inlines = [OrderItemInline]
     readonly_fields = ("user", "total_price", "created_at")
     ordering = ("-created_at",)
@@ -31,7 +36,7 @@ class OrderAdmin(admin.ModelAdmin):
         return ()
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin configuration for the Payment model."""
     list_display = (
         "id",
@@ -41,8 +46,11 @@ class PaymentAdmin(admin.ModelAdmin):
         "stripe_payment_intent_id",
         "created_at",
     )
+    # Order.__str__ renders the username
+    list_select_related = ("order__user",)
     list_filter = ("status", "created_at")
-    search_fields = ("order__id", "stripe_payment_intent_id")
+    search_fields = ("stripe_payment_intent_id__exact",)
+    exact_search_fields = ("pk", "order_id")
     readonly_fields = (
         "order",
         "amount",
@@ -55,17 +63,55 @@ class PaymentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin configuration for the Cart model."""
     list_display = ("id", "user", "created_at")
-    search_fields = ("user__username",)
+    list_select_related = ("user",)
+    search_fields = ("user__username__exact",)
     readonly_fields = ("user", "created_at")
     ordering = ("-created_at",)
 
 
+class CartItemProductFilter(IdInputFilter):
+    """Filter cart items by product id without listing every product."""
+    title = "product id"
+    parameter_name = "product_id"
+    field_name = "product_id"
+
+
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin configuration for the CartItem model."""
     list_display = ("id", "cart", "product", "quantity")
-    search_fields = ("cart__id", "product__name")
-    list_filter = ("product",)
\ No newline at end of file
+    # Cart.__str__ renders the username
+    list_select_related = ("cart__user", "product")
+    search_fields = ("product__name__exact",)
+    exact_search_fields = ("pk", "cart_id")
+    list_filter = (CartItemProductFilter,)
+    autocomplete_fields = ("product",)
+    raw_id_fields = ("cart",)
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    """Read-only items of an archived order."""
+    model = ArchivedOrderItem
+    extra = 0
+    readonly_fields = ("product_id", "product_name", "price", "quantity")
+    can_delete = False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """Read-only view of orders moved to the archive tables."""
+    list_display = ("id", "user", "status", "total_price", "created_at", "archived_at")
+    list_select_related = ("user",)
+    list_filter = ("status",)
+    search_fields = ("user__username__exact",)
+    inlines = [ArchivedOrderItemInline]
+    ordering = ("-created_at",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,62 @@
+"""
+Optional read model for carts: the fully serialized cart of each user kept in
+Django's cache (`CART_CACHE_ALIAS`), so `CartDetailView` is a single cache get.
+
+Cart views rebuild the entry write-through after every change; catalog writes
+and the reaper only invalidate, since they can touch many carts at once.
+Everything here is a no-op unless `CART_CACHE_ENABLED` is set.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Cart
+from .serializers import CartSerializer
+
+
+def cart_cache_enabled():
+    return getattr(settings, "CART_CACHE_ENABLED", False)
+
+
+def _cache():
+    return caches[settings.CART_CACHE_ALIAS]
+
+
+def cart_cache_key(user_id):
+    return f"orders:cart:user:{user_id}"
+
+
+def get_cached_cart(user_id):
+    """Return the cached cart representation of `user_id`, or None."""
+    if not cart_cache_enabled():
+        return None
+    return _cache().get(cart_cache_key(user_id))
+
+
+def store_cart(user_id, data):
+    if cart_cache_enabled():
+        _cache().set(cart_cache_key(user_id), data, settings.CART_CACHE_TIMEOUT)
+
+
+def rebuild_cart(user_id):
+    """Re-serialize `user_id`'s cart into the cache once the current transaction commits."""
+    if not cart_cache_enabled():
+        return
+
+    def rebuild():
+        cart = Cart.objects.prefetch_related('items__product__category').filter(user_id=user_id).first()
+        if cart is None:
+            _cache().delete(cart_cache_key(user_id))
+        else:
+            store_cart(user_id, CartSerializer(cart).data)
+
+    transaction.on_commit(rebuild)
+
+
+def invalidate_carts(user_ids):
+    """Drop cached carts of `user_ids` once the current transaction commits."""
+    if not cart_cache_enabled():
+        return
+    keys = [cart_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: _cache().delete_many(keys))
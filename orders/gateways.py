@@ -0,0 +1,278 @@
+"""
+Payment gateway abstraction.
+
+Views talk to `get_gateway()` instead of the Stripe SDK's module globals.
+`StripeGateway` owns a pooled keep-alive HTTP session with strict connect/read
+timeouts and a circuit breaker, so a Stripe slowdown fails fast instead of
+tying up workers. `FakeGateway` is an in-process stand-in for tests and
+offline load testing. Select one with `PAYMENT_GATEWAY` (dotted path) and
+`PAYMENT_GATEWAY_OPTIONS` (constructor kwargs).
+"""
+import abc
+import asyncio
+import contextlib
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+PaymentIntent = namedtuple("PaymentIntent", ["id", "client_secret"])
+
+
+class PaymentGatewayError(Exception):
+    """The gateway rejected the request (card declined, invalid amount, ...)."""
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """The gateway could not be reached in time, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds; then lets one trial call through (half-open).
+    Other callers keep failing fast until the trial is recorded, or until it
+    has been out for another `reset_timeout` and is presumed lost.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            if self.trial_started_at is not None and now - self.trial_started_at < self.reset_timeout:
+                # Half-open with a trial call already in flight
+                return False
+            self.trial_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_started_at is not None or self.failures >= self.failure_threshold:
+                # A failed trial re-opens the circuit straight away
+                self.opened_at = time.monotonic()
+                self.trial_started_at = None
+
+
+class PaymentGateway(abc.ABC):
+    """Interface implemented by every gateway."""
+
+    @abc.abstractmethod
+    def create_payment_intent(self, amount, currency, metadata, idempotency_key=None):
+        """Create an intent for `amount` minor units and return a PaymentIntent."""
+
+    async def create_payment_intent_async(self, amount, currency, metadata, idempotency_key=None):
+        """Async variant for ASGI views; runs the sync call in a thread by default."""
+        return await asyncio.to_thread(
+            self.create_payment_intent, amount, currency, metadata, idempotency_key
+        )
+
+    @abc.abstractmethod
+    def cancel_payment_intent(self, intent_id):
+        """
+        Cancel an intent so it can no longer be paid. Return True if it is now
+        cancelled (or already was), False if it already went through.
+        """
+
+
+class StripeGateway(PaymentGateway):
+    """Stripe PaymentIntents over a pooled, timeout-bounded HTTP client."""
+
+    # Errors that say nothing about the request itself, only about reaching Stripe
+    TRANSIENT_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+    def __init__(
+        self,
+        api_key=None,
+        connect_timeout=None,
+        read_timeout=None,
+        pool_maxsize=None,
+        max_network_retries=None,
+        failure_threshold=None,
+        reset_timeout=None,
+    ):
+        connect_timeout = connect_timeout or settings.STRIPE_CONNECT_TIMEOUT
+        read_timeout = read_timeout or settings.STRIPE_READ_TIMEOUT
+        pool_maxsize = pool_maxsize or settings.STRIPE_POOL_MAXSIZE
+
+        # One keep-alive session per process; connections are reused across requests
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+        async_client = self._async_http_client(connect_timeout, read_timeout)
+        self.supports_native_async = async_client is not None
+
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY or "",
+            http_client=stripe.RequestsClient(
+                timeout=(connect_timeout, read_timeout),
+                session=session,
+                async_fallback_client=async_client,
+            ),
+            max_network_retries=(
+                settings.STRIPE_MAX_NETWORK_RETRIES if max_network_retries is None else max_network_retries
+            ),
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold or settings.STRIPE_BREAKER_FAILURES,
+            reset_timeout=reset_timeout or settings.STRIPE_BREAKER_RESET_SECONDS,
+        )
+
+    @staticmethod
+    def _async_http_client(connect_timeout, read_timeout):
+        """httpx-backed client for the SDK's *_async methods, if httpx is installed."""
+        try:
+            import httpx
+        except ImportError:
+            return None
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        return stripe.HTTPXClient(timeout=timeout)
+
+    def _params(self, amount, currency, metadata, idempotency_key):
+        params = {"amount": amount, "currency": currency, "metadata": metadata}
+        options = {"idempotency_key": idempotency_key} if idempotency_key else {}
+        return params, options
+
+    @contextlib.contextmanager
+    def _breaker(self):
+        """Run the wrapped call behind the circuit breaker, translating SDK errors."""
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment provider is temporarily unavailable.")
+        try:
+            yield
+        except self.TRANSIENT_ERRORS as e:
+            self.breaker.record_failure()
+            raise GatewayUnavailable(str(e)) from e
+        except stripe.StripeError as e:
+            # Stripe answered; the request itself was rejected
+            self.breaker.record_success()
+            raise PaymentGatewayError(str(e)) from e
+        self.breaker.record_success()
+
+    def create_payment_intent(self, amount, currency, metadata, idempotency_key=None):
+        params, options = self._params(amount, currency, metadata, idempotency_key)
+        with self._breaker():
+            intent = self.client.v1.payment_intents.create(params=params, options=options)
+        return PaymentIntent(intent.id, intent.client_secret)
+
+    async def create_payment_intent_async(self, amount, currency, metadata, idempotency_key=None):
+        if not self.supports_native_async:
+            return await super().create_payment_intent_async(amount, currency, metadata, idempotency_key)
+
+        params, options = self._params(amount, currency, metadata, idempotency_key)
+        with self._breaker():
+            intent = await self.client.v1.payment_intents.create_async(params=params, options=options)
+        return PaymentIntent(intent.id, intent.client_secret)
+
+    def cancel_payment_intent(self, intent_id):
+        try:
+            with self._breaker():
+                self.client.v1.payment_intents.cancel(intent_id)
+        except GatewayUnavailable:
+            raise
+        except PaymentGatewayError:
+            # Stripe refuses to cancel intents that succeeded, are mid-capture or were already cancelled
+            with self._breaker():
+                intent = self.client.v1.payment_intents.retrieve(intent_id)
+            return intent.status == "canceled"
+        return True
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process gateway for tests and offline load tests.
+
+    `latency` (seconds) simulates the provider round trip; `failure_rate`
+    makes that fraction of calls raise GatewayUnavailable.
+    """
+
+    # Intents created / cancelled by any instance, newest last (inspected by tests)
+    created = []
+    cancelled = []
+    # Intent ids tests mark as paid; those can no longer be cancelled
+    settled = set()
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def _create(self, amount, currency, metadata, idempotency_key):
+        if random.random() < self.failure_rate:
+            raise GatewayUnavailable("Simulated gateway outage.")
+        intent_id = f"pi_fake_{uuid.uuid4().hex[:24]}"
+        intent = PaymentIntent(intent_id, f"{intent_id}_secret_{uuid.uuid4().hex[:12]}")
+        FakeGateway.created.append({
+            "intent": intent,
+            "amount": amount,
+            "currency": currency,
+            "metadata": metadata,
+            "idempotency_key": idempotency_key,
+        })
+        return intent
+
+    def create_payment_intent(self, amount, currency, metadata, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._create(amount, currency, metadata, idempotency_key)
+
+    async def create_payment_intent_async(self, amount, currency, metadata, idempotency_key=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._create(amount, currency, metadata, idempotency_key)
+
+    def cancel_payment_intent(self, intent_id):
+        if random.random() < self.failure_rate:
+            raise GatewayUnavailable("Simulated gateway outage.")
+        if intent_id in FakeGateway.settled:
+            return False
+        FakeGateway.cancelled.append(intent_id)
+        return True
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return this process's gateway, built once from PAYMENT_GATEWAY settings."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                gateway_class = import_string(settings.PAYMENT_GATEWAY)
+                _gateway = gateway_class(**settings.PAYMENT_GATEWAY_OPTIONS)
+    return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    """Rebuild the gateway when tests override its settings."""
+    global _gateway
+    if setting.startswith(("PAYMENT_GATEWAY", "STRIPE_")):
+        _gateway = None
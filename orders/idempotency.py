@@ -0,0 +1,94 @@
+"""
+`Idempotency-Key` support for endpoints that clients retry on timeouts.
+
+The first request with a given key runs normally and its response is stored;
+retries with the same key and body get the stored response back without
+re-running the view. Concurrent duplicates are serialized by a transaction
+scoped advisory lock (PostgreSQL), so only one of them does the work.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_fingerprint(request):
+    """Hash of everything that makes two requests "the same" request."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def acquire_advisory_lock(user_id, key):
+    """Block until no other transaction is processing this user's key."""
+    if connection.vendor != "postgresql":
+        return  # SQLite serializes writers on its own
+    digest = hashlib.sha256(f"{user_id}:{key}".encode()).digest()
+    lock_id = int.from_bytes(digest[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [lock_id])
+
+
+def idempotent(handler):
+    """Decorator for APIView handlers (e.g. `post`) that honours `Idempotency-Key`."""
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            acquire_advisory_lock(request.user.pk, key)
+            stored = IdempotencyKey.objects.filter(
+                user=request.user, key=key, expires_at__gt=timezone.now()
+            ).first()
+
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    return Response(
+                        {"detail": f"{IDEMPOTENCY_HEADER} was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                response = Response(stored.response_body, status=stored.response_status)
+                response[REPLAYED_HEADER] = "true"
+                return response
+
+            response = handler(view, request, *args, **kwargs)
+
+            # Server errors are not stored so the client can retry them
+            if response.status_code < 500:
+                body = response.data
+                if body is not None:
+                    body = json.loads(JSONRenderer().render(body))
+                IdempotencyKey.objects.update_or_create(
+                    user=request.user,
+                    key=key,
+                    defaults={
+                        "fingerprint": fingerprint,
+                        "response_status": response.status_code,
+                        "response_body": body,
+                        "expires_at": timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                    },
+                )
+        return response
+
+    return wrapper
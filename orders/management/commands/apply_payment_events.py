@@ -0,0 +1,44 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.transitions import DEFAULT_CHUNK_SIZE, apply_payment_events, payment_event_from_stripe
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay Stripe payment_intent events (a JSON array or one event per line, "
+        "e.g. exported after an outage) with set-based transitions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File with Stripe events, or '-' for stdin.")
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_CHUNK_SIZE,
+            help="Events applied per pair of UPDATE statements.",
+        )
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            # Read, but don't close, the process's stdin
+            raw = sys.stdin.read().strip()
+        else:
+            with open(options["path"], encoding="utf-8") as stream:
+                raw = stream.read().strip()
+
+        try:
+            if raw.startswith("["):
+                stripe_events = json.loads(raw)
+            else:
+                stripe_events = [json.loads(line) for line in raw.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise CommandError(f"Invalid event JSON: {e}") from e
+
+        events = [event for event in map(payment_event_from_stripe, stripe_events) if event]
+        payments, orders = apply_payment_events(events, chunk_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {len(events)} of {len(stripe_events)} events: "
+            f"{payments} payments and {orders} orders changed."
+        ))
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem, OrderStatus, Payment,
+)
+
+
+# Only orders that can no longer change are archived
+FINISHED_STATUSES = (OrderStatus.COMPLETED, OrderStatus.FAILED, OrderStatus.CANCELLED)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move finished orders older than ORDER_ARCHIVE_AFTER_DAYS, with their items and payments, "
+        "from the hot tables into the archive tables in bounded chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help="Archive orders created more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Orders moved per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        batch_size = options["batch_size"]
+
+        total = 0
+        while True:
+            moved = self.archive_batch(cutoff, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} orders."))
+
+    def archive_batch(self, cutoff, batch_size):
+        """Copy one chunk of orders into the archive and delete the hot rows."""
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(created_at__lt=cutoff, status__in=FINISHED_STATUSES)
+                .order_by("pk")[:batch_size]
+            )
+            if not orders:
+                return 0
+            order_ids = [order.pk for order in orders]
+            items = OrderItem.objects.filter(order_id__in=order_ids)
+            payments = Payment.objects.filter(order_id__in=order_ids)
+
+            ArchivedOrder.objects.bulk_create([
+                ArchivedOrder(
+                    id=order.pk,
+                    user_id=order.user_id,
+                    created_at=order.created_at,
+                    total_price=order.total_price,
+                    status=order.status,
+                )
+                for order in orders
+            ])
+            ArchivedOrderItem.objects.bulk_create([
+                ArchivedOrderItem(
+                    id=item.pk,
+                    order_id=item.order_id,
+                    product_id=item.product_id,
+                    product_name=item.product_name,
+                    quantity=item.quantity,
+                    price=item.price,
+                )
+                for item in items
+            ])
+            ArchivedPayment.objects.bulk_create([
+                ArchivedPayment(
+                    id=payment.pk,
+                    order_id=payment.order_id,
+                    amount=payment.amount,
+                    status=payment.status,
+                    stripe_payment_intent_id=payment.stripe_payment_intent_id,
+                    created_at=payment.created_at,
+                    updated_at=payment.updated_at,
+                )
+                for payment in payments
+            ])
+
+            # Payments PROTECT their order, so they go first
+            payments.delete()
+            items.delete()
+            Order.objects.filter(pk__in=order_ids).delete()
+        return len(order_ids)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from orders.models import OrderItem
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Copy product names into OrderItem.product_name for items created before the snapshot existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Order items updated per statement.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        product_name = Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("name")[:1])
+        pending = OrderItem.objects.filter(product_name="", product__isnull=False).order_by("pk")
+
+        total, last_pk = 0, 0
+        while True:
+            item_ids = list(pending.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+            if not item_ids:
+                break
+            total += OrderItem.objects.filter(pk__in=item_ids).update(product_name=product_name)
+            last_pk = item_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled product names on {total} order items."))
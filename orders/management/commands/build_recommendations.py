@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.recommendations import rebuild, update
+
+
+class Command(BaseCommand):
+    help = (
+        "Update \"frequently bought together\" recommendations from newly completed orders, "
+        "or rebuild them from every completed order with --full."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Recount all completed orders (hot and archived) instead of applying new ones.",
+        )
+        parser.add_argument(
+            "--top-k", type=int, default=settings.RECOMMENDATIONS_TOP_K,
+            help="Related products kept per product.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Completed orders applied per transaction (incremental mode).",
+        )
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            pairs = rebuild(options["top_k"])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt recommendations from {pairs} product pairs."))
+        else:
+            orders = update(options["top_k"], batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Applied {orders} completed orders to recommendations."))
@@ -0,0 +1,170 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.cart_cache import invalidate_carts
+from orders.gateways import PaymentGatewayError, get_gateway
+from orders.models import Cart, IdempotencyKey, Order, OrderStatus, Payment
+from orders.outbox import build_event, record_events
+from orders.transitions import release_order_stock
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete abandoned carts and expired idempotency keys, and cancel stale pending orders "
+        "in bounded chunks. "
+        "Rows locked by live requests are skipped (SKIP LOCKED), so this is safe to run under traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cart-idle-days", type=int, default=settings.CART_IDLE_DAYS,
+            help="Delete carts untouched for this many days.",
+        )
+        parser.add_argument(
+            "--pending-hours", type=int, default=settings.PENDING_ORDER_TTL_HOURS,
+            help="Cancel PENDING orders older than this many hours.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.REAPER_BATCH_SIZE,
+            help="Rows locked and processed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options["batch_size"]
+
+        carts = self.reap_carts(now - timedelta(days=options["cart_idle_days"]), batch_size)
+        orders = self.cancel_pending_orders(now - timedelta(hours=options["pending_hours"]), batch_size)
+        keys = self.purge_idempotency_keys(now, batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {carts} abandoned carts and {keys} expired idempotency keys, "
+            f"cancelled {orders} stale pending orders."
+        ))
+
+    def reap_carts(self, cutoff, batch_size):
+        """Delete idle carts (and their items) one locked chunk at a time."""
+        total = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    Cart.objects.select_for_update(skip_locked=True)
+                    .filter(updated_at__lt=cutoff)
+                    .order_by("pk")
+                    .values_list("pk", "user_id")[:batch_size]
+                )
+                cart_ids = [cart_id for cart_id, _ in rows]
+                if cart_ids:
+                    # The cascade removes the items with one extra DELETE
+                    Cart.objects.filter(pk__in=cart_ids, updated_at__lt=cutoff).delete()
+                    invalidate_carts([user_id for _, user_id in rows])
+            total += len(cart_ids)
+            if len(cart_ids) < batch_size:
+                return total
+
+    def cancel_pending_orders(self, cutoff, batch_size):
+        """
+        Move stale PENDING orders to CANCELLED, fail their pending payments and
+        return their units to stock.
+
+        Live payment intents are cancelled at the gateway first, so a customer
+        can't pay for an order after it was cancelled. Orders whose intent
+        already went through, or couldn't be reached, stay PENDING; the
+        webhook (or the next run) settles them.
+
+        Gateway calls happen outside any transaction: each chunk is picked
+        without locks, its intents are cancelled, and only then are the rows
+        locked for the UPDATE, re-checking that they are still PENDING and
+        have no intent the reaper didn't cancel.
+        """
+        total = 0
+        last_pk = 0
+        while True:
+            order_ids = list(
+                Order.objects.filter(status=OrderStatus.PENDING, created_at__lt=cutoff, pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return total
+            last_pk = order_ids[-1]
+
+            skipped, cancelled_intents = set(), set()
+            for order_id, intent_id in self.live_intents(order_ids):
+                if order_id in skipped:
+                    continue
+                if self.cancel_intent(intent_id):
+                    cancelled_intents.add(intent_id)
+                else:
+                    skipped.add(order_id)
+
+            with transaction.atomic():
+                locked = list(
+                    Order.objects.select_for_update(skip_locked=True)
+                    .filter(pk__in=[pk for pk in order_ids if pk not in skipped], status=OrderStatus.PENDING)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)
+                )
+                # An intent created since the gateway pass keeps its order for the next run
+                new_intents = {
+                    order_id for order_id, intent_id in self.live_intents(locked)
+                    if intent_id not in cancelled_intents
+                }
+                cancelled = [order_id for order_id in locked if order_id not in new_intents]
+                if cancelled:
+                    Order.objects.filter(pk__in=cancelled).update(status=OrderStatus.CANCELLED)
+                    release_order_stock(cancelled)
+                    Payment.objects.filter(order_id__in=cancelled, status=Payment.Status.PENDING).update(
+                        status=Payment.Status.FAILED, updated_at=timezone.now()
+                    )
+                    record_events([
+                        build_event("order.cancelled", "order", order_id, reason="payment_timeout")
+                        for order_id in cancelled
+                    ])
+            total += len(cancelled)
+            if len(order_ids) < batch_size:
+                return total
+
+    def live_intents(self, order_ids):
+        """(order_id, intent_id) of the pending payments of `order_ids` that reached the gateway."""
+        if not order_ids:
+            return []
+        return (
+            Payment.objects.filter(order_id__in=order_ids, status=Payment.Status.PENDING)
+            .exclude(stripe_payment_intent_id__isnull=True)
+            .exclude(stripe_payment_intent_id="")
+            .values_list("order_id", "stripe_payment_intent_id")
+        )
+
+    def cancel_intent(self, intent_id):
+        """Cancel `intent_id` at the gateway; False if it must be left alone for now."""
+        try:
+            return get_gateway().cancel_payment_intent(intent_id)
+        except PaymentGatewayError:
+            logger.warning("Could not cancel payment intent %s; retrying on the next run", intent_id)
+            return False
+
+    def purge_idempotency_keys(self, now, batch_size):
+        """Delete stored responses whose TTL has passed."""
+        total = 0
+        while True:
+            with transaction.atomic():
+                key_ids = list(
+                    IdempotencyKey.objects.select_for_update(skip_locked=True)
+                    .filter(expires_at__lt=now)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                if key_ids:
+                    IdempotencyKey.objects.filter(pk__in=key_ids).delete()
+            total += len(key_ids)
+            if len(key_ids) < batch_size:
+                return total
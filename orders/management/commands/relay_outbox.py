@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.outbox import get_sink, relay_pending
+
+
+class Command(BaseCommand):
+    help = "Publish unpublished outbox events to the configured sink in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE,
+            help="Events claimed and published per transaction.",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling for new events instead of exiting once the outbox is drained.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds to sleep between polls when the outbox is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        sink = get_sink()
+        total = 0
+        while True:
+            result = relay_pending(sink, options["batch_size"])
+            total += result.published
+            if result.claimed:
+                # Keep draining even if a whole batch failed: those events are
+                # retried or dead-lettered, and newer ones may be behind them
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Published {total} outbox events."))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_outbox_event'),
+        ('products', '0004_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, help_text='Product purchased (kept for reference; history reads use the snapshots below).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='products.product'),
+        ),
+    ]
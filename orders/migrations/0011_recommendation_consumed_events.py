@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_outbox_dead_letter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationcursor',
+            name='consumed_event_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
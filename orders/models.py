@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from core.money import Money, line_total, total
 from products.models import Product
 
 
@@ -18,14 +20,18 @@ class Cart(models.Model):
         related_name='cart'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last activity on the cart; abandoned carts are reaped by `manage.py reap_stale`
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def touch(self):
+        """Mark the cart as active with a single UPDATE (item writes don't save the cart row)."""
+        self.updated_at = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
 
     @property
     def total_price(self):
-        """Total price of all items in the cart."""
-        # Ensure items exist before summing
-        if self.items.exists():
-             return sum(item.total_price for item in self.items.all())
-        return 0 # Return 0 if cart has no items
+        """Total price of all items in the cart, as Money (zero for an empty cart)."""
+        return total(item.total_price for item in self.items.all())
 
 
     def __str__(self):
@@ -42,11 +48,12 @@ class CartItem(models.Model):
 
     @property
     def unit_price(self):
-        return self.product.price if self.product else 0
+        return Money.from_decimal(self.product.price) if self.product else Money()
 
     @property
     def total_price(self):
-        return self.unit_price * self.quantity
+        product = self.product
+        return line_total(product.price, self.quantity) if product else Money()
 
     def __str__(self):
         product_name = self.product.name if self.product else "N/A"
@@ -72,6 +79,12 @@ class Order(models.Model):
     )
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Lets the reaper find stale pending orders without scanning history
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Order history: one user's orders, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         # Defensive but still clean
@@ -86,19 +99,23 @@ class OrderItem(models.Model):
     )
     product = models.ForeignKey(
         Product,
-        on_delete=models.PROTECT,
-        help_text="Product purchased (protected from deletion if ordered)."
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='order_items',
+        help_text="Product purchased (kept for reference; history reads use the snapshots below)."
     )
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)  # price at purchase time
+    product_name = models.CharField(max_length=255, blank=True, default='')  # name at purchase time
 
     @property
     def total_price(self):
-        """Returns total cost for this item."""
-        return self.quantity * self.price
+        """Returns total cost for this item, as Money."""
+        return line_total(self.price, self.quantity)
 
     def __str__(self):
-        return f"{self.quantity} × {getattr(self.product, 'name', 'Unknown')} (Order #{self.order_id})"
+        return f"{self.quantity} × {self.product_name or 'Unknown'} (Order #{self.order_id})"
     
 class Payment(models.Model):
     class Status(models.TextChoices):
@@ -127,4 +144,191 @@ class Payment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Payment {self.pk} for Order {self.order_id} - {self.status}"
\ No newline at end of file
+        return f"Payment {self.pk} for Order {self.order_id} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response stored for a request sent with an `Idempotency-Key` header.
+    Retries with the same key replay it instead of re-running the view.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body; a reused key with another request is rejected
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} for user {self.user_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the state change it
+    describes, and published later by `manage.py relay_outbox`.
+    """
+    event_type = models.CharField(max_length=64)  # e.g. "order.placed"
+    aggregate_type = models.CharField(max_length=32)  # "order" or "payment"
+    aggregate_id = models.PositiveBigIntegerField()
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    published_at = models.DateTimeField(null=True, blank=True)
+    # Set once OUTBOX_MAX_ATTEMPTS publishes have failed; the relay skips the event from then on
+    failed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # The relay only ever scans the unpublished, not dead-lettered tail
+            models.Index(
+                fields=['id'],
+                condition=models.Q(published_at__isnull=True, failed_at__isnull=True),
+                name='outbox_unpublished_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} for {self.aggregate_type} {self.aggregate_id}"
+
+
+# --------------------------------------------------
+# Archive tables
+# Cold orders are moved here by `manage.py archive_orders`, keeping the hot
+# tables (and their indexes) sized to recent history. Rows keep their ids.
+# --------------------------------------------------
+
+class ArchivedOrder(models.Model):
+    """Archived copy of a finished Order."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name='archived_orders'
+    )
+    created_at = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=OrderStatus.choices)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.pk} by {getattr(self.user, 'username', 'Unknown')}"
+
+
+class ArchivedOrderItem(models.Model):
+    """Archived copy of an OrderItem."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    # Plain id, no FK: archived history never constrains the catalog
+    product_id = models.BigIntegerField(null=True, blank=True)
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def total_price(self):
+        return line_total(self.price, self.quantity)
+
+    def __str__(self):
+        return f"{self.quantity} × {self.product_name or 'Unknown'} (Archived order #{self.order_id})"
+
+
+class ArchivedPayment(models.Model):
+    """Archived copy of a Payment."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='payments'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Payment.Status.choices)
+    stripe_payment_intent_id = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived payment {self.pk} for order {self.order_id} - {self.status}"
+
+
+# --------------------------------------------------
+# "Frequently bought together"
+# Built from completed orders by `manage.py build_recommendations`.
+# --------------------------------------------------
+
+class ProductPairCount(models.Model):
+    """
+    Number of completed orders containing both products: one cell of the
+    sparse co-occurrence matrix, stored once per pair (product_a < product_b).
+    """
+    product_a = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    product_b = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_a', 'product_b'], name='product_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product_b'], name='product_pair_b_idx'),
+        ]
+
+    def __str__(self):
+        return f"Products {self.product_a_id} & {self.product_b_id}: {self.orders} orders"
+
+
+class ProductAssociation(models.Model):
+    """The top-K products bought together with `product`, ranked 1..K (served as-is by the API)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index behind the related-products lookup
+            models.UniqueConstraint(fields=['product', 'rank'], name='product_association_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} for product {self.product_id}: product {self.related_id}"
+
+
+class RecommendationCursor(models.Model):
+    """
+    Which `order.completed` outbox events are folded into the pair counts:
+    every one up to `last_event_id`, plus the later ids in `consumed_event_ids`
+    (events newer than the settle window, which may commit out of id order).
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    last_event_id = models.PositiveBigIntegerField(default=0)
+    consumed_event_ids = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at event {self.last_event_id}"
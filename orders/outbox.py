@@ -0,0 +1,170 @@
+"""
+Transactional outbox.
+
+State changes call `record_event()` inside their own transaction, so an event
+exists if and only if the change committed. `relay_pending()` (driven by
+`manage.py relay_outbox`) later hands unpublished events to the configured
+sink in batches, keeping side effects such as e-mails and notifications off
+the request and webhook paths. An event the sink keeps rejecting is
+dead-lettered after OUTBOX_MAX_ATTEMPTS tries rather than retried forever.
+"""
+import abc
+import json
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+RelayResult = namedtuple("RelayResult", ["claimed", "published"])
+
+
+def build_event(event_type, aggregate_type, aggregate_id, **payload):
+    """Return an unsaved event (for bulk_create)."""
+    return OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        payload=payload,
+    )
+
+
+def record_event(event_type, aggregate_type, aggregate_id, **payload):
+    """Write one event; call inside the transaction that makes the change."""
+    event = build_event(event_type, aggregate_type, aggregate_id, **payload)
+    event.save()
+    return event
+
+
+def record_events(events):
+    """Write several unsaved events with one INSERT."""
+    return OutboxEvent.objects.bulk_create(events)
+
+
+def serialize_event(event):
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "aggregate_type": event.aggregate_type,
+        "aggregate_id": event.aggregate_id,
+        "payload": event.payload,
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+# --------------------------------------------------
+# Sinks
+# --------------------------------------------------
+
+class OutboxSink(abc.ABC):
+    """Publishes a batch of events; raising makes the relay retry them one by one."""
+
+    @abc.abstractmethod
+    def publish(self, events):
+        """Deliver `events`, or raise to have the relay retry them."""
+
+
+class LogSink(OutboxSink):
+    """Writes each event to the application log."""
+
+    def publish(self, events):
+        for event in events:
+            logger.info("Outbox event %s", json.dumps(serialize_event(event)))
+
+
+class FileSink(OutboxSink):
+    """Appends events as JSON lines to a local file (a stand-in for a message queue)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, "a", encoding="utf-8") as stream:
+            stream.writelines(json.dumps(serialize_event(event)) + "\n" for event in events)
+
+
+class MemorySink(OutboxSink):
+    """Keeps published events in memory; used by tests."""
+
+    published = []
+
+    def publish(self, events):
+        MemorySink.published.extend(serialize_event(event) for event in events)
+
+
+def get_sink():
+    """Instantiate the sink configured by OUTBOX_SINK / OUTBOX_SINK_OPTIONS."""
+    return import_string(settings.OUTBOX_SINK)(**settings.OUTBOX_SINK_OPTIONS)
+
+
+# --------------------------------------------------
+# Relay
+# --------------------------------------------------
+
+def relay_pending(sink, batch_size, max_attempts=None):
+    """
+    Publish one batch of pending events. Return a RelayResult with how many
+    events were claimed and how many of those were sent.
+
+    Rows are claimed with SKIP LOCKED so several relays can run side by side.
+    If the sink rejects the batch, its events are retried one by one, so a
+    single bad event can't hold back the others. Each event that still fails
+    has its attempt counter bumped. Once it has failed `max_attempts` times
+    (default OUTBOX_MAX_ATTEMPTS) it is dead-lettered: `failed_at` is set and
+    the relay no longer picks it up.
+    """
+    if max_attempts is None:
+        max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True, failed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return RelayResult(0, 0)
+
+        now = timezone.now()
+        try:
+            sink.publish(events)
+        except Exception:
+            logger.exception("Outbox sink failed on a batch of %d events; retrying them one by one", len(events))
+            published, failed = _publish_each(sink, events)
+        else:
+            published, failed = events, []
+
+        if published:
+            OutboxEvent.objects.filter(pk__in=[event.id for event in published]).update(
+                published_at=now, updated_at=now
+            )
+        if failed:
+            claimed = OutboxEvent.objects.filter(pk__in=[event.id for event in failed])
+            claimed.update(attempts=F("attempts") + 1, updated_at=now)
+            dead = claimed.filter(attempts__gte=max_attempts)
+            dead_ids = list(dead.values_list("id", flat=True))
+            if dead_ids:
+                dead.update(failed_at=now)
+                logger.error("Dead-lettered outbox events %s after %d failed attempts", dead_ids, max_attempts)
+    return RelayResult(len(events), len(published))
+
+
+def _publish_each(sink, events):
+    """Publish `events` individually; return (published, failed)."""
+    published, failed = [], []
+    for event in events:
+        try:
+            sink.publish([event])
+        except Exception:
+            logger.exception("Outbox sink failed on event %s", event.id)
+            failed.append(event)
+        else:
+            published.append(event)
+    return published, failed
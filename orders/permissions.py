@@ -18,15 +18,16 @@ class IsCartOwner(permissions.BasePermission):
         """
         Object-level permission check:
         - If obj is a Cart → must belong to the requesting user.
-        - If obj is a CartItem → its cart must belong to the requesting user.
+        - If obj is a CartItem → its cart must belong to the requesting user
+          (load items with select_related('cart') to keep this query-free).
         """
-        user = request.user
+        user_id = request.user.id
 
-        # Handle both Cart and CartItem types gracefully
-        if hasattr(obj, "user"):
-            return obj.user == user
-        if hasattr(obj, "cart") and hasattr(obj.cart, "user"):
-            return obj.cart.user == user
+        # Compare foreign key ids so no related rows have to be loaded
+        if hasattr(obj, "user_id"):
+            return obj.user_id == user_id
+        if hasattr(obj, "cart"):
+            return obj.cart.user_id == user_id
 
         # Explicitly deny if object type is unexpected
-        return False
\ No newline at end of file
+        return False
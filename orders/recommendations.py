@@ -0,0 +1,213 @@
+"""
+"Frequently bought together" recommendations.
+
+Completed orders are streamed as baskets (distinct product ids per order) and
+every pair in a basket adds one to a sparse co-occurrence matrix
+(`ProductPairCount`). The K strongest neighbours of each product are kept in
+`ProductAssociation`, which the API reads with a single indexed lookup.
+
+`rebuild()` recomputes everything from the hot and archived order tables.
+`update()` folds in orders completed since the last run, found through their
+`order.completed` outbox events. Only the products in those orders get their
+top-K recomputed.
+
+Outbox ids are assigned at INSERT, not at commit, so a lower id can become
+visible after a higher one. The cursor therefore keeps a watermark only up
+to the settled point (events older than RECOMMENDATIONS_SETTLE_SECONDS, whose
+transactions are over), and records the newer events it consumed one by
+one. The rebuild's scan leaves out orders whose unsettled completion event
+it didn't see, so an order completing mid-rebuild is counted once, by the
+next `update()`.
+
+Counting is pure Python: `itertools.combinations` + `Counter` per basket, both
+implemented in C, so there is no numpy/scipy dependency.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from products.models import Product
+from .models import (
+    ArchivedOrderItem, OrderItem, OrderStatus, OutboxEvent,
+    ProductAssociation, ProductPairCount, RecommendationCursor,
+)
+
+
+CURSOR_NAME = "frequently_bought_together"
+COMPLETED_EVENT = "order.completed"
+# Baskets larger than this are bulk/B2B orders; their pairs say little and cost O(n^2)
+MAX_BASKET_SIZE = 50
+WRITE_BATCH_SIZE = 1000
+
+
+def iter_order_baskets(items, chunk_size=2000):
+    """Yield (order_id, sorted distinct product ids) per order, streaming `items` ordered by order."""
+    rows = (
+        items.filter(product_id__isnull=False)
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    for order_id, group in groupby(rows, key=itemgetter(0)):
+        yield order_id, sorted({product_id for _, product_id in group})
+
+
+def iter_baskets(items, chunk_size=2000):
+    """Yield the sorted distinct product ids of each order in `items`."""
+    for _, basket in iter_order_baskets(items, chunk_size=chunk_size):
+        yield basket
+
+
+def count_pairs(baskets):
+    """Sparse co-occurrence counts {(a, b): orders} with a < b."""
+    counts = Counter()
+    for basket in baskets:
+        if 1 < len(basket) <= MAX_BASKET_SIZE:
+            counts.update(combinations(basket, 2))
+    return counts
+
+
+def _existing(counts):
+    """Drop pairs that mention products deleted since the order (archived items keep plain ids)."""
+    product_ids = {product_id for pair in counts for product_id in pair}
+    existing = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+    return {pair: n for pair, n in counts.items() if pair[0] in existing and pair[1] in existing}
+
+
+def top_neighbours(pairs, top_k, product_ids=None):
+    """{product_id: [(related_id, orders), ...]} strongest first, from (a, b, orders) triples."""
+    neighbours = defaultdict(list)
+    for a, b, n in pairs:
+        neighbours[a].append((n, -b, b))
+        neighbours[b].append((n, -a, a))
+    if product_ids is not None:
+        neighbours = {pid: neighbours[pid] for pid in product_ids if pid in neighbours}
+    # Ties go to the lower product id so results are stable between runs
+    return {
+        pid: [(related, n) for n, _, related in heapq.nlargest(top_k, candidates)]
+        for pid, candidates in neighbours.items()
+    }
+
+
+def _write_associations(neighbours):
+    ProductAssociation.objects.bulk_create(
+        [
+            ProductAssociation(product_id=pid, related_id=related, rank=rank, orders=n)
+            for pid, ranked in neighbours.items()
+            for rank, (related, n) in enumerate(ranked, start=1)
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def _completed_events():
+    return OutboxEvent.objects.filter(event_type=COMPLETED_EVENT)
+
+
+def _settled_event_id():
+    """Highest outbox id inserted before the settle window; no lower id can still commit."""
+    horizon = timezone.now() - timedelta(seconds=settings.RECOMMENDATIONS_SETTLE_SECONDS)
+    return OutboxEvent.objects.filter(created_at__lt=horizon).order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+def rebuild(top_k):
+    """Recompute all pair counts and associations from every completed order; return pairs stored."""
+    # Completions up to the settled id are all visible. Later ones are tracked by id: those
+    # visible now are counted by the scan, any that commit afterwards are left to update().
+    settled = _settled_event_id()
+    consumed = list(_completed_events().filter(pk__gt=settled).values_list("pk", flat=True))
+    completed = Q(order__status=OrderStatus.COMPLETED)
+    later = _completed_events().filter(pk__gt=settled).exclude(pk__in=consumed).values("aggregate_id")
+    counts = count_pairs(iter_baskets(OrderItem.objects.filter(completed).exclude(order_id__in=later)))
+    counts.update(count_pairs(iter_baskets(ArchivedOrderItem.objects.filter(completed).exclude(order_id__in=later))))
+    counts = _existing(counts)
+
+    with transaction.atomic():
+        ProductPairCount.objects.all().delete()
+        ProductPairCount.objects.bulk_create(
+            [ProductPairCount(product_a_id=a, product_b_id=b, orders=n) for (a, b), n in counts.items()],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+        ProductAssociation.objects.all().delete()
+        _write_associations(top_neighbours(((a, b, n) for (a, b), n in counts.items()), top_k))
+        RecommendationCursor.objects.update_or_create(
+            name=CURSOR_NAME, defaults={"last_event_id": settled, "consumed_event_ids": consumed}
+        )
+    return len(counts)
+
+
+def update(top_k, batch_size=500):
+    """Fold orders completed since the last run into the counts; return the number of orders applied."""
+    applied = 0
+    settled = _settled_event_id()
+    while True:
+        with transaction.atomic():
+            cursor, _ = RecommendationCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+            events = list(
+                _completed_events()
+                .filter(pk__gt=cursor.last_event_id)
+                .exclude(pk__in=cursor.consumed_event_ids)
+                .order_by("pk")
+                .values_list("pk", "aggregate_id")[:batch_size]
+            )
+            if events:
+                order_ids = [order_id for _, order_id in events]
+                baskets = dict(iter_order_baskets(OrderItem.objects.filter(order_id__in=order_ids)))
+                # Orders archived since they completed; keyed by order, so one moved between the reads counts once
+                baskets.update(iter_order_baskets(ArchivedOrderItem.objects.filter(order_id__in=order_ids)))
+                counts = _existing(count_pairs(baskets.values()))
+                if counts:
+                    _add_counts(counts)
+                    _refresh_associations({product_id for pair in counts for product_id in pair}, top_k)
+
+            # Every visible event up to the batch's last id is now consumed; below the settled
+            # id nothing else can appear, so the watermark moves there and the ids under it go
+            drained = len(events) < batch_size
+            watermark = max(cursor.last_event_id, settled if drained else min(settled, events[-1][0]))
+            consumed = [
+                pk for pk in [*cursor.consumed_event_ids, *(pk for pk, _ in events)] if pk > watermark
+            ]
+            if events or watermark != cursor.last_event_id:
+                cursor.last_event_id = watermark
+                cursor.consumed_event_ids = consumed
+                cursor.save(update_fields=["last_event_id", "consumed_event_ids", "updated_at"])
+        applied += len(events)
+        if drained:
+            return applied
+
+
+def _add_counts(counts):
+    """Increment stored pair counts by `counts`, creating missing cells."""
+    stored = {
+        (row.product_a_id, row.product_b_id): row
+        for row in ProductPairCount.objects.select_for_update().filter(
+            product_a_id__in={a for a, _ in counts}, product_b_id__in={b for _, b in counts}
+        )
+    }
+    changed, created = [], []
+    for pair, n in counts.items():
+        row = stored.get(pair)
+        if row is None:
+            created.append(ProductPairCount(product_a_id=pair[0], product_b_id=pair[1], orders=n))
+        else:
+            row.orders += n
+            changed.append(row)
+    ProductPairCount.objects.bulk_update(changed, ["orders"], batch_size=WRITE_BATCH_SIZE)
+    ProductPairCount.objects.bulk_create(created, batch_size=WRITE_BATCH_SIZE)
+
+
+def _refresh_associations(product_ids, top_k):
+    """Recompute the top-K rows of `product_ids` from the stored pair counts."""
+    pairs = ProductPairCount.objects.filter(
+        Q(product_a_id__in=product_ids) | Q(product_b_id__in=product_ids)
+    ).values_list("product_a_id", "product_b_id", "orders")
+    neighbours = top_neighbours(pairs.iterator(), top_k, product_ids=product_ids)
+    ProductAssociation.objects.filter(product_id__in=product_ids).delete()
+    _write_associations(neighbours)
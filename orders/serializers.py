@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from core.money import MoneyField
 from .models import Cart, CartItem, Order, OrderItem, Payment, OrderStatus
+from .models import ArchivedOrder, ArchivedOrderItem
 from products.serializers import ProductSerializer
 from products.models import Product
 from .models import Order, OrderItem
@@ -18,23 +20,36 @@ class CartItemSerializer(serializers.ModelSerializer):
         required=False
     )
     product = ProductSerializer(read_only=True)
-    unit_price = serializers.ReadOnlyField()
-    total_price = serializers.ReadOnlyField()
+    unit_price = MoneyField()
+    total_price = MoneyField()
 
     class Meta:
         model = CartItem
         fields = ('id', 'product_id', 'product', 'quantity', 'unit_price', 'total_price')
+        # Columns behind the computed fields (for ?fields=, see core/sparse.py)
+        sparse_dependencies = {
+            'unit_price': ['product__price'],
+            'total_price': ['product__price', 'quantity'],
+        }
 
 
 class CartSerializer(serializers.ModelSerializer):
     """Serializer for the user's cart."""
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.ReadOnlyField()
+    total_price = MoneyField()
 
     class Meta:
         model = Cart
         fields = ('id', 'items', 'total_price', 'created_at')
         read_only_fields = ('created_at',)
+        sparse_dependencies = {'total_price': ['items__product__price', 'items__quantity']}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # An empty cart's total has always been the integer 0, not 0.0 (items are prefetched)
+        if 'total_price' in data and not instance.items.all():
+            data['total_price'] = 0
+        return data
 
 
 class AddItemSerializer(serializers.Serializer):
@@ -50,20 +65,17 @@ class UpdateItemSerializer(serializers.Serializer):
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Serializer for individual items within an order."""
-    product_id = serializers.IntegerField(source='product.id', read_only=True)
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    total_price = serializers.SerializerMethodField()
+    # Both come from the item row itself, so history reads never touch the catalog
+    product_id = serializers.IntegerField(read_only=True)
+    product_name = serializers.CharField(read_only=True)
+    total_price = MoneyField()
 
-    
     class Meta:
         model = OrderItem
         fields = ('id', 'product_id', 'product_name', 'quantity', 'price', 'total_price')
         read_only_fields = fields  
+        sparse_dependencies = {'total_price': ['quantity', 'price']}
 
-    def get_total_price(self, obj):
-        """Return total cost for this item."""
-        return obj.quantity * obj.price
-    
 
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer for displaying complete order details."""
@@ -76,6 +88,23 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('id', 'user', 'created_at', 'total_price', 'items', 'status')
         read_only_fields = fields
+        sparse_dependencies = {'user': ['user__username'], 'status': ['status']}
+
+
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    """Same representation as OrderItemSerializer, read from the archive table."""
+
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Same representation as OrderSerializer, read from the archive tables."""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
 
 class PaymentSerializer(serializers.ModelSerializer):
     """Serializer for representing Payment instances."""
@@ -0,0 +1,39 @@
+"""
+Invalidates cached carts (see orders.cart_cache) when a product they show changes.
+"""
+from django.apps import apps
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from products.signals import stock_changed
+from .cart_cache import cart_cache_enabled, invalidate_carts
+from .models import Cart
+
+
+Product = apps.get_model('products', 'Product')
+
+
+def _invalidate_carts_containing(product_ids):
+    user_ids = Cart.objects.filter(items__product_id__in=product_ids).values_list('user_id', flat=True).distinct()
+    invalidate_carts(list(user_ids))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    # New products are in nobody's cart yet
+    if cart_cache_enabled() and not created:
+        _invalidate_carts_containing([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # Before the delete: afterwards the cascaded cart items are gone
+    if cart_cache_enabled():
+        _invalidate_carts_containing([instance.pk])
+
+
+@receiver(stock_changed, sender=Product)
+def stock_changed_in_bulk(sender, product_ids, **kwargs):
+    # Checkouts, restocks and snapshot syncs update stock without saving the products
+    if cart_cache_enabled() and product_ids:
+        _invalidate_carts_containing(product_ids)
@@ -1,3 +1,828 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from config.testing import QueryCountScalingMixin
+from products.inventory import set_stock, take_stock
+from products.models import Category, Product, StockShard
+from .models import (
+    ArchivedOrder, Cart, CartItem, IdempotencyKey, Order, OrderItem, OrderStatus, OutboxEvent, Payment,
+    ProductAssociation, ProductPairCount, RecommendationCursor,
+)
+from .cart_cache import get_cached_cart, store_cart
+from .gateways import CircuitBreaker, FakeGateway
+from . import recommendations
+from .outbox import MemorySink, OutboxSink, record_event, relay_pending
+from .transitions import PaymentEvent, apply_payment_events
+
+
+User = get_user_model()
+
+
+def make_products(count, prefix="Product"):
+    """Create `count` categorised products."""
+    category = Category.objects.create(name=f"{prefix} category")
+    return Product.objects.bulk_create([
+        Product(name=f"{prefix} {i}", price=Decimal("10.00"), stock=50, category=category)
+        for i in range(count)
+    ])
+
+
+def fill_cart(user, count):
+    """Give `user` a cart holding `count` distinct products."""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    products = make_products(count, prefix=f"Cart {count}")
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=p, quantity=2) for p in products])
+    return cart
+
+
+def make_orders(user, count, items_per_order=2):
+    """Create `count` orders for `user`, each with `items_per_order` lines."""
+    products = make_products(items_per_order, prefix=f"Order {count}")
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_price=Decimal("20.00") * items_per_order) for _ in range(count)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=2, price=product.price, product_name=product.name)
+        for order in orders
+        for product in products
+    ])
+    return orders
+
+
+class OrderFlowQueryCountTests(QueryCountScalingMixin, APITestCase):
+    """Cart and order endpoints must not issue per-row queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass12345")
+        self.client.force_authenticate(self.user)
+
+    def test_cart_detail(self):
+        def build(scale):
+            return fill_cart(self.user, scale)
+
+        def call(cart):
+            return self.client.get(reverse("orders:cart-detail", kwargs={"id": cart.id}))
+
+        self.assertConstantQueries(build, call)
+
+    def test_add_item_to_cart(self):
+        def build(scale):
+            fill_cart(self.user, scale)
+            return make_products(1, prefix=f"Extra {scale}")[0]
+
+        def call(product):
+            return self.client.post(
+                reverse("orders:cart-add-item"), {"product_id": product.id, "quantity": 1}
+            )
+
+        self.assertConstantQueries(build, call)
+
+    def test_update_cart_item(self):
+        def build(scale):
+            return fill_cart(self.user, scale).items.first()
+
+        def call(item):
+            url = reverse("orders:cart-item-detail", kwargs={"cart_id": item.cart_id, "item_id": item.id})
+            return self.client.patch(url, {"quantity": 3})
+
+        self.assertConstantQueries(build, call)
+
+    def test_place_order(self):
+        self.assertConstantQueries(
+            lambda scale: fill_cart(self.user, scale),
+            lambda _: self.client.post(reverse("orders:place-order")),
+        )
+
+    def test_order_history(self):
+        self.assertConstantQueries(
+            lambda scale: make_orders(self.user, scale),
+            lambda _: self.client.get(reverse("orders:order-history")),
+        )
+
+
+class CartItemOwnershipTests(APITestCase):
+    """Item lookups enforce ownership in the lookup query itself."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="owner", password="pass12345")
+        self.item = fill_cart(self.user, 1).items.get()
+        self.url = reverse(
+            "orders:cart-item-detail", kwargs={"cart_id": self.item.cart_id, "item_id": self.item.id}
+        )
+
+    def test_patch_costs_lookup_plus_write(self):
+        self.client.force_authenticate(self.user)
+        # Lookup, item UPDATE, cart activity UPDATE
+        with self.assertNumQueries(3):
+            response = self.client.patch(self.url, {"quantity": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["item"]["quantity"], 5)
+
+    def test_delete_costs_lookup_plus_write(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CartItem.objects.filter(pk=self.item.pk).exists())
+
+    def test_other_users_item_is_not_found(self):
+        intruder = User.objects.create_user(username="intruder", password="pass12345")
+        self.client.force_authenticate(intruder)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(pk=self.item.pk).exists())
+
+
+class ReapStaleCommandTests(APITestCase):
+    """`manage.py reap_stale` removes abandoned carts and cancels stale orders."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="idle", password="pass12345")
+        self.active_user = User.objects.create_user(username="active", password="pass12345")
+        self.long_ago = timezone.now() - timedelta(days=90)
+
+    def test_abandoned_carts_are_deleted(self):
+        stale = fill_cart(self.user, 3)
+        fresh = fill_cart(self.active_user, 2)
+        Cart.objects.filter(pk=stale.pk).update(updated_at=self.long_ago)
+
+        call_command("reap_stale", "--batch-size", "1", stdout=StringIO())
+
+        self.assertEqual(list(Cart.objects.values_list("pk", flat=True)), [fresh.pk])
+        self.assertFalse(CartItem.objects.filter(cart_id=stale.pk).exists())
+
+    def test_stale_pending_orders_are_cancelled(self):
+        stale, recent = make_orders(self.user, 2)
+        Order.objects.filter(pk=stale.pk).update(created_at=self.long_ago)
+        payment = Payment.objects.create(order=stale, amount=stale.total_price)
+
+        call_command("reap_stale", stdout=StringIO())
+
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        payment.refresh_from_db()
+        self.assertEqual(stale.status, OrderStatus.CANCELLED)
+        self.assertEqual(recent.status, OrderStatus.PENDING)
+        self.assertEqual(payment.status, Payment.Status.FAILED)
+        # The cancelled order's 2 units of each product are back on the shelf
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {52})
+
+    @override_settings(PAYMENT_GATEWAY="orders.gateways.FakeGateway")
+    def test_live_intents_are_cancelled_or_left_to_the_webhook(self):
+        FakeGateway.cancelled.clear()
+        abandoned, paid = make_orders(self.user, 2)
+        Order.objects.update(created_at=self.long_ago)
+        Payment.objects.bulk_create([
+            Payment(order=abandoned, amount=abandoned.total_price, stripe_payment_intent_id="pi_abandoned"),
+            Payment(order=paid, amount=paid.total_price, stripe_payment_intent_id="pi_paid"),
+        ])
+        FakeGateway.settled.add("pi_paid")
+        self.addCleanup(FakeGateway.settled.discard, "pi_paid")
+
+        call_command("reap_stale", "--batch-size", "1", stdout=StringIO())
+
+        self.assertEqual(FakeGateway.cancelled, ["pi_abandoned"])
+        statuses = dict(Order.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {abandoned.pk: OrderStatus.CANCELLED, paid.pk: OrderStatus.PENDING})
+        self.assertEqual(Payment.objects.get(order=paid).status, Payment.Status.PENDING)
+
+    @override_settings(PAYMENT_GATEWAY="orders.gateways.FakeGateway")
+    def test_gateway_is_called_outside_transactions_and_rows_are_rechecked(self):
+        settled, abandoned = make_orders(self.user, 2)
+        Order.objects.update(created_at=self.long_ago)
+        Payment.objects.bulk_create([
+            Payment(order=order, amount=order.total_price, stripe_payment_intent_id=f"pi_{order.pk}")
+            for order in (settled, abandoned)
+        ])
+
+        test_atomic_depth = len(connection.atomic_blocks)
+
+        def cancel_intent(command, intent_id):
+            # No transaction of the reaper's own is open around the gateway call
+            self.assertEqual(len(connection.atomic_blocks), test_atomic_depth)
+            if intent_id == f"pi_{settled.pk}":
+                # The webhook settles the order while the reaper talks to the gateway
+                Order.objects.filter(pk=settled.pk).update(status=OrderStatus.COMPLETED)
+            return True
+
+        with mock.patch("orders.management.commands.reap_stale.Command.cancel_intent", cancel_intent):
+            call_command("reap_stale", stdout=StringIO())
+
+        statuses = dict(Order.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {settled.pk: OrderStatus.COMPLETED, abandoned.pk: OrderStatus.CANCELLED})
+        # Only the cancelled order gives its units back
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {52})
+
+    def test_expired_idempotency_keys_are_purged(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key="old", fingerprint="x", response_status=201,
+            expires_at=timezone.now() - timedelta(hours=1),
+        )
+        IdempotencyKey.objects.create(
+            user=self.user, key="live", fingerprint="x", response_status=201,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        call_command("reap_stale", stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["live"])
+
+
+class IdempotencyKeyTests(APITestCase):
+    """Retries with the same Idempotency-Key replay the stored response."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="retrier", password="pass12345")
+        self.client.force_authenticate(self.user)
+        fill_cart(self.user, 2)
+
+    def test_replay_does_not_place_a_second_order(self):
+        url = reverse("orders:place-order")
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY="order-1")
+        fill_cart(self.user, 1)  # a re-run would now succeed with a new order
+        retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY="order-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json()["id"], first.data["id"])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        order = make_orders(self.user, 1)[0]
+        url = reverse("orders:create-payment-intent")
+        self.client.post(url, {"order_id": order.id + 1}, HTTP_IDEMPOTENCY_KEY="pay-1")
+        response = self.client.post(url, {"order_id": order.id}, HTTP_IDEMPOTENCY_KEY="pay-1")
+        self.assertEqual(response.status_code, 422)
+
+
+@override_settings(OUTBOX_SINK="orders.outbox.MemorySink")
+class OutboxTests(APITestCase):
+    """State changes write outbox events that the relay publishes once."""
+
+    def setUp(self):
+        MemorySink.published.clear()
+        self.user = User.objects.create_user(username="notified", password="pass12345")
+        self.client.force_authenticate(self.user)
+
+    def test_placed_order_is_published_once(self):
+        fill_cart(self.user, 2)
+        order_id = self.client.post(reverse("orders:place-order")).data["id"]
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.event_type, event.aggregate_id), ("order.placed", order_id))
+        self.assertIsNone(event.published_at)
+
+        call_command("relay_outbox", stdout=StringIO())
+        call_command("relay_outbox", stdout=StringIO())
+
+        self.assertEqual([published["type"] for published in MemorySink.published], ["order.placed"])
+        event.refresh_from_db()
+        self.assertIsNotNone(event.published_at)
+
+    def test_failing_event_is_dead_lettered_without_blocking_the_rest(self):
+        class PickySink(MemorySink):
+            def publish(self, events):
+                if any(event.payload.get("poison") for event in events):
+                    raise ValueError("unserializable event")
+                super().publish(events)
+
+        poison = record_event("order.placed", "order", 1, poison=True)
+        record_event("order.placed", "order", 2)
+
+        with self.assertLogs("orders.outbox", "ERROR"):
+            self.assertEqual(relay_pending(PickySink(), batch_size=10, max_attempts=2).published, 1)
+            self.assertEqual(relay_pending(PickySink(), batch_size=10, max_attempts=2).published, 0)
+        self.assertEqual([published["aggregate_id"] for published in MemorySink.published], [2])
+
+        poison.refresh_from_db()
+        self.assertEqual(poison.attempts, 2)
+        self.assertIsNotNone(poison.failed_at)
+        self.assertIsNone(poison.published_at)
+        record_event("order.placed", "order", 3)
+        self.assertEqual(relay_pending(PickySink(), batch_size=10, max_attempts=2).published, 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_command_drains_past_a_batch_that_only_failed(self):
+        class PickySink(MemorySink):
+            def publish(self, events):
+                if any(event.payload.get("poison") for event in events):
+                    raise ValueError("unserializable event")
+                super().publish(events)
+
+        record_event("order.placed", "order", 1, poison=True)
+        record_event("order.placed", "order", 2)
+
+        output = StringIO()
+        sink = mock.patch("orders.management.commands.relay_outbox.get_sink", PickySink)
+        with sink, self.assertLogs("orders.outbox", "ERROR"):
+            call_command("relay_outbox", "--batch-size", "1", stdout=output)
+
+        self.assertEqual([published["aggregate_id"] for published in MemorySink.published], [2])
+        self.assertIn("Published 1 outbox events.", output.getvalue())
+
+    def test_sink_that_always_fails_dead_letters_after_max_attempts(self):
+        class BrokenSink(OutboxSink):
+            def publish(self, events):
+                raise ConnectionError("broker down")
+
+        record_event("order.placed", "order", 1)
+        with self.assertLogs("orders.outbox", "ERROR"):
+            for _ in range(3):
+                self.assertEqual(relay_pending(BrokenSink(), batch_size=10, max_attempts=3).published, 0)
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 3)
+        self.assertIsNotNone(event.failed_at)
+        # Nothing left to claim: the relay no longer retries it
+        with self.assertNumQueries(3):
+            self.assertEqual(relay_pending(BrokenSink(), batch_size=10, max_attempts=3).published, 0)
+
+
+class PaymentTransitionTests(APITestCase):
+    """Stripe events are applied with set-based, guarded UPDATEs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="payer", password="pass12345")
+        self.orders = make_orders(self.user, 3)
+        self.payments = Payment.objects.bulk_create([
+            Payment(order=order, amount=order.total_price) for order in self.orders
+        ])
+
+    def event(self, payment, event_type):
+        return PaymentEvent(payment.id, event_type, f"pi_{payment.id}")
+
+    def test_batch_costs_two_updates_plus_outbox_insert(self):
+        events = [
+            self.event(self.payments[0], "payment_intent.succeeded"),
+            self.event(self.payments[1], "payment_intent.payment_failed"),
+            self.event(self.payments[0], "payment_intent.payment_failed"),  # duplicate, ignored
+        ]
+        # Savepoint, payments UPDATE, orders UPDATE, the failed order's items, stock UPDATE,
+        # category recount, outbox INSERT, release
+        with self.assertNumQueries(8):
+            self.assertEqual(apply_payment_events(events), (2, 2))
+
+        statuses = dict(Order.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[self.orders[0].pk], OrderStatus.COMPLETED)
+        self.assertEqual(statuses[self.orders[1].pk], OrderStatus.FAILED)
+        self.assertEqual(statuses[self.orders[2].pk], OrderStatus.PENDING)
+        self.assertEqual(Payment.objects.get(pk=self.payments[0].pk).stripe_payment_intent_id, f"pi_{self.payments[0].id}")
+        # Only the failed order gives its units back
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {52})
+
+    def test_replays_are_no_ops(self):
+        events = [self.event(payment, "payment_intent.succeeded") for payment in self.payments]
+        self.assertEqual(apply_payment_events(events, chunk_size=2), (3, 3))
+        self.assertEqual(apply_payment_events(events), (0, 0))
+        self.assertEqual(OutboxEvent.objects.count(), 6)
+
+    def test_command_reads_stdin_without_closing_it(self):
+        stdin = StringIO("[]")
+        with mock.patch("sys.stdin", stdin):
+            call_command("apply_payment_events", "-", stdout=StringIO())
+        self.assertFalse(stdin.closed)
+
+
+class OrderItemSnapshotTests(APITestCase):
+    """Order history is served from the item snapshots, not the catalog."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="historian", password="pass12345")
+        self.client.force_authenticate(self.user)
+
+    def test_history_survives_catalog_cleanup(self):
+        fill_cart(self.user, 1)
+        self.client.post(reverse("orders:place-order"))
+        item = OrderItem.objects.get()
+        name = item.product_name
+        item.product.delete()
+
+        line = self.client.get(reverse("orders:order-history")).data[0]["items"][0]
+        self.assertEqual((line["product_id"], line["product_name"]), (None, name))
+
+    def test_backfill_copies_names(self):
+        order = make_orders(self.user, 1, items_per_order=3)[0]
+        order.items.update(product_name="")
+
+        call_command("backfill_order_item_names", "--batch-size", "2", stdout=StringIO())
+
+        for item in order.items.select_related("product"):
+            self.assertEqual(item.product_name, item.product.name)
+
+
+class OrderArchiveTests(APITestCase):
+    """Old finished orders move to the archive but stay readable."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="veteran", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.old, self.pending, self.recent = make_orders(self.user, 3)
+        long_ago = timezone.now() - timedelta(days=800)
+        Order.objects.filter(pk__in=[self.old.pk, self.pending.pk]).update(created_at=long_ago)
+        Order.objects.filter(pk=self.old.pk).update(status=OrderStatus.COMPLETED)
+        Payment.objects.create(order=self.old, amount=self.old.total_price, status=Payment.Status.SUCCEEDED)
+
+    def test_archive_moves_only_old_finished_orders(self):
+        call_command("archive_orders", stdout=StringIO())
+
+        self.assertEqual(
+            set(Order.objects.values_list("pk", flat=True)), {self.pending.pk, self.recent.pk}
+        )
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(archived.pk, self.old.pk)
+        self.assertEqual(archived.items.count(), 2)
+        self.assertEqual(archived.payments.get().status, Payment.Status.SUCCEEDED)
+
+    def test_history_reads_archive_on_request(self):
+        call_command("archive_orders", stdout=StringIO())
+        url = reverse("orders:order-history")
+
+        hot = [order["id"] for order in self.client.get(url).data]
+        self.assertNotIn(self.old.pk, hot)
+
+        everything = self.client.get(url, {"include_archived": "true"}).data
+        self.assertEqual(everything[-1]["id"], self.old.pk)
+        self.assertEqual(len(everything[-1]["items"]), 2)
+
+
+@override_settings(CART_CACHE_ENABLED=True)
+class CartReadModelTests(APITestCase):
+    """Cart reads are served from the cache and kept fresh by cart and catalog writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="browser", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.cart = fill_cart(self.user, 2)
+        self.url = reverse("orders:cart-detail", kwargs={"id": self.cart.id})
+
+    def test_cart_read_is_a_cache_get(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["items"]), 2)
+
+    def test_cart_writes_rebuild_the_entry(self):
+        item = self.cart.items.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("orders:cart-item-detail", kwargs={"cart_id": self.cart.id, "item_id": item.id}),
+                {"quantity": 7},
+            )
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        quantities = {line["id"]: line["quantity"] for line in response.data["items"]}
+        self.assertEqual(quantities[item.id], 7)
+
+    def test_price_change_invalidates_the_entry(self):
+        self.client.get(self.url)
+        product = Product.objects.get(pk=self.cart.items.first().product_id)
+        product.price = Decimal("99.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        prices = {line["product"]["id"]: line["unit_price"] for line in self.client.get(self.url).data["items"]}
+        self.assertEqual(prices[product.id], Decimal("99.00"))
+
+    def test_totals_render_the_previous_json(self):
+        body = self.client.get(self.url).content
+        self.assertIn(b'"total_price":40.0', body)
+
+        self.cart.items.all().delete()
+        cache.clear()
+        self.assertIn(b'"total_price":0,', self.client.get(self.url).content)
+
+    def test_other_users_cart_is_not_served_from_cache(self):
+        self.client.get(self.url)
+        intruder = User.objects.create_user(username="peeker", password="pass12345")
+        self.client.force_authenticate(intruder)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+@override_settings(PAYMENT_GATEWAY="orders.gateways.FakeGateway")
+class PaymentIntentTests(APITestCase):
+    """Payment intents go through the configured gateway."""
+
+    def setUp(self):
+        FakeGateway.created.clear()
+        self.user = User.objects.create_user(username="checkout", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.order = make_orders(self.user, 1)[0]
+        self.url = reverse("orders:create-payment-intent")
+
+    def test_intent_is_created_with_amount_in_cents(self):
+        response = self.client.post(self.url, {"order_id": self.order.id})
+
+        self.assertEqual(response.status_code, 201)
+        created = FakeGateway.created[-1]
+        self.assertEqual(created["amount"], 4000)
+        self.assertEqual(response.data["clientSecret"], created["intent"].client_secret)
+        payment = Payment.objects.get(pk=response.data["payment_id"])
+        self.assertEqual(payment.stripe_payment_intent_id, created["intent"].id)
+
+    @override_settings(PAYMENT_GATEWAY_OPTIONS={"failure_rate": 1.0})
+    def test_outage_returns_503_and_fails_the_payment(self):
+        response = self.client.post(self.url, {"order_id": self.order.id})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Payment.objects.get(order=self.order).status, Payment.Status.FAILED)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_threshold_and_half_opens_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_lets_a_single_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        self.assertTrue(breaker.allow())
+        # Concurrent callers fail fast while the trial is in flight
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_lost_trial_is_replaced_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())  # never recorded
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+
+class AdminChangelistTests(QueryCountScalingMixin, TestCase):
+    """Admin changelists stay constant-query and avoid full-table scans."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="pass12345", email="a@example.com")
+        self.client.force_login(self.admin)
+
+    def test_order_and_payment_changelists(self):
+        def build(scale):
+            orders = make_orders(User.objects.create_user(username=f"buyer{scale}", password="x"), scale)
+            Payment.objects.bulk_create([Payment(order=order, amount=order.total_price) for order in orders])
+
+        for url in (reverse("admin:orders_order_changelist"), reverse("admin:orders_payment_changelist")):
+            with self.subTest(url=url):
+                self.assertConstantQueries(build, lambda _, url=url: self.client.get(url))
+
+    def test_numeric_search_matches_order_id_exactly(self):
+        user = User.objects.create_user(username="buyer", password="x")
+        orders = make_orders(user, 12)
+        response = self.client.get(reverse("admin:orders_order_changelist"), {"q": str(orders[0].id)})
+        self.assertEqual(list(response.context["cl"].result_list), [orders[0]])
+
+    def test_cart_item_product_input_filter(self):
+        user = User.objects.create_user(username="buyer", password="x")
+        cart = fill_cart(user, 3)
+        product_id = cart.items.first().product_id
+        response = self.client.get(reverse("admin:orders_cartitem_changelist"), {"product_id": product_id})
+        self.assertEqual([item.product_id for item in response.context["cl"].result_list], [product_id])
+        self.assertContains(response, f'name="product_id" value="{product_id}"')
+
+
+class SparseFieldsetTests(APITestCase):
+    """?fields= / ?expand= on the cart and order history endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="mobile", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.cart = fill_cart(self.user, 2)
+        self.url = reverse("orders:cart-detail", kwargs={"id": self.cart.id})
+
+    def test_cart_fields_drive_the_queries(self):
+        fields = {"fields": "id,items.quantity,items.product.name"}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, fields)
+
+        item = response.data["items"][0]
+        self.assertEqual(set(response.data), {"id", "items"})
+        self.assertEqual((set(item), set(item["product"])), ({"quantity", "product"}, {"name"}))
+        self.assertEqual(len(ctx.captured_queries), 2)  # cart, items joined with product
+        self.assertTrue(all("description" not in query["sql"] for query in ctx.captured_queries))
+
+    @override_settings(CART_CACHE_ENABLED=True)
+    def test_cached_cart_is_pruned_not_replaced(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"fields": "id,total_price,items"})
+        self.assertEqual(response.data["items"], [item.id for item in self.cart.items.order_by("id")])
+        self.assertEqual(response.data["total_price"], self.client.get(self.url).data["total_price"])
+        self.assertIn("product", self.client.get(self.url).data["items"][0])
+
+    def test_order_history_fields(self):
+        make_orders(self.user, 3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("orders:order-history"), {"fields": "id,status,total_price"})
+        self.assertEqual(set(response.data[0]), {"id", "status", "total_price"})
+
+        response = self.client.get(reverse("orders:order-history"), {"fields": "id,items.product_name"})
+        self.assertEqual(set(response.data[0]["items"][0]), {"product_name"})
+
+
+class RecommendationTests(APITestCase):
+    """Frequently-bought-together pairs are counted offline and served from one lookup."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="shopper", password="pass12345")
+        self.products = make_products(4, prefix="Basket")
+
+    def complete(self, *baskets):
+        """Place one order per basket of product indexes and complete them through payment events."""
+        events = []
+        for basket in baskets:
+            order = Order.objects.create(user=self.user, total_price=Decimal("10.00") * len(basket))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.products[i], quantity=1, price=Decimal("10.00"))
+                for i in basket
+            ])
+            payment = Payment.objects.create(order=order, amount=order.total_price)
+            events.append(PaymentEvent(payment.id, "payment_intent.succeeded", f"pi_{payment.id}"))
+        apply_payment_events(events)
+
+    def related(self, index):
+        return ProductAssociation.objects.filter(product=self.products[index]).order_by("rank")
+
+    def test_full_rebuild_ranks_neighbours(self):
+        self.complete([0, 1], [0, 1, 2], [0, 2], [0, 1])
+        make_orders(self.user, 2)  # pending orders are ignored
+
+        call_command("build_recommendations", "--full", "--top-k", "2", stdout=StringIO())
+
+        a, b, c, _ = (product.pk for product in self.products)
+        self.assertEqual(list(self.related(0).values_list("related_id", "orders")), [(b, 3), (c, 2)])
+        self.assertEqual(list(self.related(2).values_list("related_id", "orders")), [(a, 2), (b, 1)])
+        self.assertEqual(ProductPairCount.objects.get(product_a_id=b, product_b_id=c).orders, 1)
+
+    def test_incremental_update_applies_only_new_orders(self):
+        self.complete([0, 1])
+        call_command("build_recommendations", "--full", stdout=StringIO())
+        self.complete([0, 2], [0, 2], [1, 3])
+
+        call_command("build_recommendations", "--batch-size", "2", stdout=StringIO())
+        call_command("build_recommendations", stdout=StringIO())  # nothing new: a no-op
+
+        a, b, c, _ = (product.pk for product in self.products)
+        self.assertEqual(list(self.related(0).values_list("related_id", "orders")), [(c, 2), (b, 1)])
+        self.assertEqual(list(self.related(3).values_list("related_id", "orders")), [(b, 1)])
+        self.assertEqual(ProductPairCount.objects.get(product_a_id=a, product_b_id=b).orders, 1)
+
+    def test_order_completed_during_rebuild_is_counted_once(self):
+        self.complete([0, 1])
+        count_pairs = recommendations.count_pairs
+        midway = []
+
+        def complete_before_scan(baskets):
+            # The watermark has been read, the scan hasn't run yet: another order completes now
+            if not midway:
+                midway.append(True)
+                self.complete([0, 1])
+            return count_pairs(baskets)
+
+        with mock.patch.object(recommendations, "count_pairs", complete_before_scan):
+            recommendations.rebuild(top_k=5)
+        recommendations.update(top_k=5)
+
+        a, b = self.products[0].pk, self.products[1].pk
+        self.assertEqual(ProductPairCount.objects.get(product_a_id=a, product_b_id=b).orders, 2)
+
+    def test_event_committing_below_the_watermark_is_still_counted(self):
+        self.complete([0, 1])
+        self.complete([0, 2])
+        early, _ = list(OutboxEvent.objects.filter(event_type="order.completed").order_by("pk"))
+        # The lower id is still uncommitted while update() consumes the higher one
+        OutboxEvent.objects.filter(pk=early.pk).delete()
+        recommendations.update(top_k=5)
+        OutboxEvent.objects.bulk_create([early])
+        recommendations.update(top_k=5)
+
+        a, b, c, _ = (product.pk for product in self.products)
+        pairs = ProductPairCount.objects.values_list("product_a_id", "product_b_id", "orders")
+        self.assertEqual({(pa, pb): n for pa, pb, n in pairs}, {(a, b): 1, (a, c): 1})
+
+        # Once both events have settled, the watermark passes them and the per-event ids are dropped
+        with self.settings(RECOMMENDATIONS_SETTLE_SECONDS=0):
+            recommendations.update(top_k=5)
+        cursor = RecommendationCursor.objects.get()
+        self.assertEqual(cursor.last_event_id, OutboxEvent.objects.order_by("pk").last().pk)
+        self.assertEqual(cursor.consumed_event_ids, [])
+
+    def test_update_reads_orders_archived_since_completion(self):
+        call_command("build_recommendations", "--full", stdout=StringIO())
+        self.complete([0, 3])
+        call_command("archive_orders", "--older-than-days", "0", stdout=StringIO())
+        self.assertFalse(OrderItem.objects.exists())
+
+        call_command("build_recommendations", stdout=StringIO())
+        self.assertEqual(list(self.related(3).values_list("related_id", "orders")), [(self.products[0].pk, 1)])
+
+    def test_related_endpoint_is_one_query(self):
+        self.complete([0, 1], [0, 1], [0, 2])
+        call_command("build_recommendations", "--full", stdout=StringIO())
+        set_stock(self.products[1].pk, shards=2)
+        StockShard.objects.filter(product=self.products[1], shard=0).update(quantity=0)
+        url = reverse("product-related", kwargs={"pk": self.products[0].pk})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        results = response.data["results"]
+        self.assertEqual([item["id"] for item in results], [self.products[1].pk, self.products[2].pk])
+        self.assertEqual([item["bought_together"] for item in results], [2, 1])
+        self.assertEqual(results[0]["category"]["name"], "Basket category")
+        self.assertEqual([item["stock"] for item in results], [25, 50])  # shard total, not the snapshot
+
+    def test_related_without_history(self):
+        url = reverse("product-related", kwargs={"pk": self.products[3].pk})
+        self.assertEqual(self.client.get(url).data, {"results": []})
+        self.assertEqual(self.client.get(reverse("product-related", kwargs={"pk": 999999})).status_code, 404)
+
+
+class CheckoutStockTests(APITestCase):
+    """Placing an order takes its quantities out of stock, all or nothing."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="buyer", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.cart = fill_cart(self.user, 2)  # 2 units each of products with 50 in stock
+        self.url = reverse("orders:place-order")
+
+    def test_order_decrements_stock(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {48})
+
+    def test_short_product_rejects_the_whole_order(self):
+        short = self.cart.items.first().product
+        Product.objects.filter(pk=short.pk).update(stock=1)
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(short.name, response.data["detail"])
+        self.assertEqual(sorted(Product.objects.values_list("stock", flat=True)), [1, 50])
+        self.assertEqual((Order.objects.count(), self.cart.items.count()), (0, 2))
+
+    def test_sell_out_is_recounted_from_the_stock_at_checkout(self):
+        products = [item.product for item in self.cart.items.all()]  # loaded with 50 in stock
+        # Another checkout takes all but the last 2 units of the first product meanwhile
+        Product.objects.filter(pk=products[0].pk).update(stock=2)
+        Category.refresh_product_counts({products[0].category_id})
+
+        with transaction.atomic():
+            take_stock([(product, 2) for product in products])
+
+        category = Category.objects.get(pk=products[0].category_id)
+        self.assertEqual((category.product_count, category.in_stock_count), (2, 1))
+
+    @override_settings(CART_CACHE_ENABLED=True)
+    def test_checkout_drops_cached_carts_holding_the_products(self):
+        other = User.objects.create_user(username="other", password="pass12345")
+        other_cart = Cart.objects.create(user=other)
+        CartItem.objects.create(cart=other_cart, product=self.cart.items.first().product, quantity=1)
+        store_cart(other.id, {"id": other_cart.id, "items": []})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(self.url).status_code, 201)
+
+        self.assertIsNone(get_cached_cart(other.id))
+
+    def test_failed_payment_restocks_the_order(self):
+        order_id = self.client.post(self.url).data["id"]
+        payment = Payment.objects.create(order_id=order_id, amount=Decimal("40.00"))
+
+        apply_payment_events([PaymentEvent(payment.id, "payment_intent.payment_failed", "pi_declined")])
+        apply_payment_events([PaymentEvent(payment.id, "payment_intent.payment_failed", "pi_declined")])  # replay
+
+        self.assertEqual(Order.objects.get(pk=order_id).status, OrderStatus.FAILED)
+        self.assertEqual(set(Product.objects.values_list("stock", flat=True)), {50})
@@ -0,0 +1,161 @@
+"""
+Set-based payment/order state transitions for Stripe events.
+
+A whole batch of events is applied with two statements: one UPDATE ...
+RETURNING for the payments and one for their orders. The state machine
+guard (only PENDING rows move) lives in the WHERE clauses, so replays and
+duplicate deliveries are no-ops without any row locking in Python.
+Orders that fail give their units back to stock (`release_order_stock`).
+"""
+import logging
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from products.inventory import release_stock
+from .models import Order, OrderItem, OrderStatus, Payment
+from .outbox import build_event, record_events
+
+
+logger = logging.getLogger(__name__)
+
+# Stripe event type -> (new payment status, new order status)
+PAYMENT_TRANSITIONS = {
+    "payment_intent.succeeded": (Payment.Status.SUCCEEDED, OrderStatus.COMPLETED),
+    "payment_intent.payment_failed": (Payment.Status.FAILED, OrderStatus.FAILED),
+}
+
+# Events per statement; keeps parameter lists well inside database limits
+DEFAULT_CHUNK_SIZE = 500
+
+PaymentEvent = namedtuple("PaymentEvent", ["payment_id", "event_type", "stripe_payment_intent_id"])
+
+
+def payment_event_from_stripe(event):
+    """Build a PaymentEvent from a Stripe event dict, or None if it is not actionable."""
+    event_type = event.get("type")
+    if event_type not in PAYMENT_TRANSITIONS:
+        return None
+    intent = event["data"]["object"]
+    try:
+        payment_id = int(intent.get("metadata", {}).get("payment_id"))
+    except (TypeError, ValueError):
+        return None
+    return PaymentEvent(payment_id, event_type, intent.get("id"))
+
+
+def _case(column, mapping):
+    """SQL `CASE column WHEN %s THEN %s ... END` plus its parameters."""
+    sql = " ".join("WHEN %s THEN %s" for _ in mapping)
+    params = [value for pair in mapping.items() for value in pair]
+    return f"CASE {column} {sql} END", params
+
+
+def _update_payments(events):
+    """Move PENDING payments to their new status; return [(payment_id, order_id, status)]."""
+    qn = connection.ops.quote_name
+    statuses = {event.payment_id: PAYMENT_TRANSITIONS[event.event_type][0] for event in events}
+    intent_ids = {
+        event.payment_id: event.stripe_payment_intent_id
+        for event in events if event.stripe_payment_intent_id
+    }
+
+    status_sql, status_params = _case(qn("id"), statuses)
+    set_clauses = [f"{qn('status')} = {status_sql}"]
+    params = status_params
+    if intent_ids:
+        intent_sql, intent_params = _case(qn("id"), intent_ids)
+        column = qn("stripe_payment_intent_id")
+        set_clauses.append(f"{column} = COALESCE({intent_sql}, {column})")
+        params += intent_params
+    set_clauses.append(f"{qn('updated_at')} = %s")
+    params.append(timezone.now())
+
+    placeholders = ", ".join(["%s"] * len(statuses))
+    sql = (
+        f"UPDATE {qn(Payment._meta.db_table)} SET {', '.join(set_clauses)} "
+        f"WHERE {qn('id')} IN ({placeholders}) AND {qn('status')} = %s "
+        f"RETURNING {qn('id')}, {qn('order_id')}, {qn('status')}"
+    )
+    params += list(statuses) + [Payment.Status.PENDING]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _update_orders(order_statuses):
+    """Move PENDING orders to their new status; return [(order_id, status)]."""
+    qn = connection.ops.quote_name
+    status_sql, params = _case(qn("id"), order_statuses)
+    placeholders = ", ".join(["%s"] * len(order_statuses))
+    sql = (
+        f"UPDATE {qn(Order._meta.db_table)} SET {qn('status')} = {status_sql} "
+        f"WHERE {qn('id')} IN ({placeholders}) AND {qn('status')} = %s "
+        f"RETURNING {qn('id')}, {qn('status')}"
+    )
+    params += list(order_statuses) + [OrderStatus.PENDING]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def release_order_stock(order_ids):
+    """Return the units checkout took for `order_ids` to stock (call when they fail or are cancelled)."""
+    items = (
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .select_related('product')
+        .only('quantity', 'product__stock', 'product__stock_shards', 'product__category')
+    )
+    release_stock([(item.product, item.quantity) for item in items])
+
+
+def apply_payment_events(events, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Apply PaymentEvents in bulk and return (payments_changed, orders_changed).
+
+    The first event per payment wins; events for payments that are no longer
+    PENDING are ignored. An order completes if any of its payments in the batch
+    succeeded; one that fails releases its stock. Outbox events are written in
+    the same transaction.
+    """
+    unique = {}
+    for event in events:
+        unique.setdefault(event.payment_id, event)
+    events = list(unique.values())
+
+    payments_changed = orders_changed = 0
+    for start in range(0, len(events), chunk_size):
+        chunk = events[start:start + chunk_size]
+        with transaction.atomic():
+            payment_rows = _update_payments(chunk)
+
+            order_statuses = {}
+            for _, order_id, payment_status in payment_rows:
+                if payment_status == Payment.Status.SUCCEEDED:
+                    order_statuses[order_id] = OrderStatus.COMPLETED
+                else:
+                    order_statuses.setdefault(order_id, OrderStatus.FAILED)
+            order_rows = _update_orders(order_statuses) if order_statuses else []
+            failed = [order_id for order_id, order_status in order_rows if order_status == OrderStatus.FAILED]
+            if failed:
+                release_order_stock(failed)
+
+            outbox = [
+                build_event(f"payment.{payment_status.lower()}", "payment", payment_id, order_id=order_id)
+                for payment_id, order_id, payment_status in payment_rows
+            ]
+            outbox += [
+                build_event(f"order.{order_status.lower()}", "order", order_id)
+                for order_id, order_status in order_rows
+            ]
+            record_events(outbox)
+
+        payments_changed += len(payment_rows)
+        orders_changed += len(order_rows)
+
+    logger.info(
+        "Applied %d payment events: %d payments and %d orders changed",
+        len(events), payments_changed, orders_changed
+    )
+    return payments_changed, orders_changed
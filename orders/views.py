@@ -1,32 +1,73 @@
+import logging
+
 from rest_framework import status, views, generics, permissions
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.apps import apps
 
 from .models import Cart, CartItem, OrderStatus, Payment
 from .serializers import CartSerializer, CartItemSerializer, AddItemSerializer, UpdateItemSerializer
 from .permissions import IsCartOwner
-from .models import Order, OrderItem
+from .idempotency import idempotent
+from .cart_cache import get_cached_cart, rebuild_cart, store_cart
+from .outbox import record_event
+from .transitions import PAYMENT_TRANSITIONS, apply_payment_events, payment_event_from_stripe
+from .models import ArchivedOrder, Order, OrderItem
 from .serializers import OrderSerializer, CreatePaymentIntentSerializer, PaymentSerializer
+from .serializers import ArchivedOrderSerializer
+from .gateways import GatewayUnavailable, PaymentGatewayError, get_gateway
 import stripe
 from django.conf import settings
-# Set the Stripe API key on module load
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from core.money import Money
+from products.inventory import OutOfStock, take_stock
+from core.sparse import SparseFieldsetMixin, nested_paths, prune_representation, restrict_queryset
 
 Product = apps.get_model('products', 'Product')
 
+logger = logging.getLogger(__name__)
+
 
-class CartDetailView(generics.RetrieveAPIView):
+class CartDetailView(SparseFieldsetMixin, generics.RetrieveAPIView):
     """
     GET /api/v1/orders/carts/<id>/
     Retrieve the current user's cart (only accessible by the owner).
+    Supports `?fields=` / `?expand=`, e.g. `?fields=id,items.quantity,items.product.name`.
     """
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    queryset = Cart.objects.prefetch_related('items__product__category').all()
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated, IsCartOwner]
     lookup_url_kwarg = 'id'
 
+    def get_queryset(self):
+        paths = self.sparse_paths()
+        if paths is None:
+            return super().get_queryset()
+
+        # IsCartOwner reads user_id
+        queryset = restrict_queryset(Cart.objects.all(), paths | {'user'})
+        item_paths = nested_paths(paths, 'items')
+        if item_paths or 'items' in paths:
+            items = restrict_queryset(CartItem.objects.all(), item_paths | {'cart'})
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=items))
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        # The cache is keyed by the requesting user, so a hit is already owner-checked
+        data = get_cached_cart(request.user.id)
+        if data is not None and data['id'] == kwargs['id']:
+            if self.fieldset is None:
+                return Response(data)
+            self.sparse_paths()  # validates the requested fields
+            return Response(prune_representation(data, *self.fieldset))
+
+        response = super().retrieve(request, *args, **kwargs)
+        # Only full representations are cached
+        if self.fieldset is None:
+            store_cart(request.user.id, response.data)
+        return response
+
 
 class AddItemToCartView(views.APIView):
     """
@@ -46,7 +87,9 @@ class AddItemToCartView(views.APIView):
             with transaction.atomic():
                 product = Product.objects.select_for_update().get(pk=product_id)
 
-                cart, _ = Cart.objects.get_or_create(user=request.user)
+                cart, cart_created = Cart.objects.get_or_create(user=request.user)
+                if not cart_created:
+                    cart.touch()
 
                 item, created = CartItem.objects.select_for_update().get_or_create(
                     cart=cart,
@@ -66,6 +109,11 @@ class AddItemToCartView(views.APIView):
                 item.refresh_from_db()
                 item_serializer = CartItemSerializer(item)
 
+            rebuild_cart(request.user.id)
+            logger.info(
+                detail_message,
+                extra={"user_id": request.user.id, "product_id": product_id, "sample": True}
+            )
             return Response(
                 {"detail": detail_message, "item": item_serializer.data},
                 status=status_code
@@ -76,8 +124,11 @@ class AddItemToCartView(views.APIView):
                 {"detail": "Product not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
-            print(f"❌ Error adding item to cart: {e}")
+        except Exception:
+            logger.exception(
+                "Error adding item to cart",
+                extra={"user_id": request.user.id, "product_id": product_id}
+            )
             return Response(
                 {"detail": "An internal error occurred."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -93,24 +144,33 @@ class UpdateCartItemView(views.APIView):
     permission_classes = [permissions.IsAuthenticated, IsCartOwner]
 
     def get_object(self, cart_id, item_id, user):
-        cart = get_object_or_404(Cart, pk=cart_id, user=user)
-        item = get_object_or_404(CartItem, pk=item_id, cart=cart)
-        self.check_object_permissions(self.request, cart)
-        return cart, item
+        # Ownership is enforced by the lookup itself: one query fetches the item,
+        # its cart and the product needed for the response, or raises 404.
+        item = get_object_or_404(
+            CartItem.objects.select_related('cart', 'product__category'),
+            pk=item_id,
+            cart_id=cart_id,
+            cart__user_id=user.id,
+        )
+        self.check_object_permissions(self.request, item)
+        return item
 
     def patch(self, request, cart_id, item_id):
-        cart, item = self.get_object(cart_id, item_id, request.user)
+        item = self.get_object(cart_id, item_id, request.user)
         serializer = UpdateItemSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         new_quantity = serializer.validated_data['quantity']
 
         if new_quantity <= 0:
             item.delete()
+            item.cart.touch()
+            rebuild_cart(request.user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         item.quantity = new_quantity
-        item.save()
-        item.refresh_from_db()
+        item.save(update_fields=['quantity'])
+        item.cart.touch()
+        rebuild_cart(request.user.id)
         item_serializer = CartItemSerializer(item)
         return Response(
             {"detail": "Item quantity updated.", "item": item_serializer.data},
@@ -118,18 +178,23 @@ class UpdateCartItemView(views.APIView):
         )
 
     def delete(self, request, cart_id, item_id):
-        cart, item = self.get_object(cart_id, item_id, request.user)
+        item = self.get_object(cart_id, item_id, request.user)
         item.delete()
+        item.cart.touch()
+        rebuild_cart(request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 class PlaceOrderView(views.APIView):
     """
     POST /api/v1/orders/place-order/
     Converts the current user's active cart into a finalized order.
-    Clears the cart after successful order placement.
+    Takes the ordered quantities out of stock (409 if a product ran out)
+    and clears the cart after successful order placement.
+    Retries carrying the same `Idempotency-Key` header replay the first response.
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         try:
             cart = Cart.objects.prefetch_related('items__product').get(user=request.user)
@@ -149,15 +214,18 @@ class PlaceOrderView(views.APIView):
             with transaction.atomic():
                 order = Order.objects.create(
                     user=request.user,
-                    total_price=cart.total_price
+                    total_price=cart.total_price.to_decimal()
                 )
 
+                take_stock([(item.product, item.quantity) for item in cart.items.all()])
+
                 order_items = [
                     OrderItem(
                         order=order,
                         product=item.product,
                         quantity=item.quantity,
-                        price=item.unit_price
+                        price=item.unit_price.to_decimal(),
+                        product_name=item.product.name
                     )
                     for item in cart.items.all()
                 ]
@@ -165,34 +233,82 @@ class PlaceOrderView(views.APIView):
                 OrderItem.objects.bulk_create(order_items)
 
                 cart.items.all().delete()
+                rebuild_cart(request.user.id)
+
+                record_event(
+                    "order.placed", "order", order.id,
+                    user_id=request.user.id,
+                    total_price=str(order.total_price),
+                    item_count=len(order_items),
+                )
 
-        except Exception as e:
-            print(f"❌ Error placing order: {e}")
+        except OutOfStock:
+            raise
+        except Exception:
+            logger.exception("Error placing order", extra={"user_id": request.user.id})
             return Response(
                 {"detail": "An error occurred while placing the order."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        logger.info(
+            "Order placed",
+            extra={"user_id": request.user.id, "order_id": order.id, "sample": True}
+        )
+
+        # Load the new items in one query; their product snapshots need no joins
+        prefetch_related_objects([order], 'items')
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
-class OrderHistoryView(generics.ListAPIView):
-    """Returns the authenticated user's order history."""
+class OrderHistoryView(SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Returns the authenticated user's order history.
+
+    Only the hot tables are read by default; `?include_archived=true`
+    appends orders moved to the archive by `manage.py archive_orders`.
+    Supports `?fields=` / `?expand=`, e.g. `?fields=id,status,total_price`.
+    """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def restrict_orders(self, queryset):
+        """Load the user and items, limited to the requested fields if any."""
+        paths = self.sparse_paths()
+        if paths is None:
+            return queryset.select_related('user').prefetch_related('items')
+
+        item_paths = nested_paths(paths, 'items')
+        queryset = restrict_queryset(queryset, paths)
+        if item_paths or 'items' in paths:
+            item_model = queryset.model._meta.get_field('items').related_model
+            items = restrict_queryset(item_model.objects.all(), item_paths | {'order'})
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=items))
+        return queryset
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
-    
+        return self.restrict_orders(Order.objects.filter(user=self.request.user))
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('include_archived', '').lower() in ('1', 'true'):
+            archived = self.restrict_orders(ArchivedOrder.objects.filter(user=request.user))
+            serializer = self.apply_fieldset(ArchivedOrderSerializer(archived, many=True))
+            # Archived orders are always older than hot ones, so they go last
+            response.data = list(response.data) + serializer.data
+        return response
+
 
 class CreatePaymentIntentView(views.APIView):
     """
     POST /api/v1/orders/create-payment-intent/
     Creates a Stripe PaymentIntent for a given order belonging to the authenticated user.
+    Retries carrying the same `Idempotency-Key` header replay the first response.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = CreatePaymentIntentSerializer
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         # Validate request data
         serializer = self.serializer_class(data=request.data)
@@ -212,29 +328,37 @@ class CreatePaymentIntentView(views.APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        amount_in_cents = int(order.total_price * 100)
+        amount = Money.from_decimal(order.total_price)
 
         # Create Payment + Stripe Intent atomically
         with transaction.atomic():
             payment = Payment.objects.create(
                 order=order,
-                amount=order.total_price,
+                amount=amount.to_decimal(),
                 status=Payment.Status.PENDING
             )
 
             try:
-                intent = stripe.PaymentIntent.create(
-                    amount=amount_in_cents,
+                intent = get_gateway().create_payment_intent(
+                    amount=amount.cents,
                     currency='usd',
                     metadata={
                         'order_id': order.id,
                         'payment_id': payment.id,
                         'user_id': request.user.id
-                    }
+                    },
+                    # Lets the provider dedupe its own network retries for this payment
+                    idempotency_key=f"payment-{payment.id}"
                 )
 
                 payment.stripe_payment_intent_id = intent.id
                 payment.save(update_fields=['stripe_payment_intent_id'])
+                record_event(
+                    "payment.created", "payment", payment.id,
+                    order_id=order.id,
+                    amount=str(payment.amount),
+                    stripe_payment_intent_id=intent.id,
+                )
 
                 return Response(
                     {
@@ -245,15 +369,29 @@ class CreatePaymentIntentView(views.APIView):
                     status=status.HTTP_201_CREATED
                 )
 
-            except stripe.StripeError as e:
+            except PaymentGatewayError as e:
                 payment.status = Payment.Status.FAILED
                 payment.save(update_fields=['status'])
+                record_event("payment.failed", "payment", payment.id, order_id=order.id)
+                if isinstance(e, GatewayUnavailable):
+                    logger.warning(
+                        "Payment gateway unavailable: %s", e,
+                        extra={"order_id": order.id, "payment_id": payment.id}
+                    )
+                    return Response(
+                        {"detail": "Payment provider is temporarily unavailable. Please retry."},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE
+                    )
                 return Response(
                     {"detail": str(e)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            except Exception as e:
+            except Exception:
+                logger.exception(
+                    "Error creating payment intent",
+                    extra={"order_id": order.id, "payment_id": payment.id}
+                )
                 transaction.set_rollback(True)
                 return Response(
                     {"detail": "An unexpected error occurred."},
@@ -276,7 +414,7 @@ class StripeWebhookView(views.APIView):
 
         # Ensure webhook secret is configured
         if not endpoint_secret:
-            print("❌ Webhook Error: STRIPE_WEBHOOK_SECRET not configured in settings.py.")
+            logger.error("Webhook error: STRIPE_WEBHOOK_SECRET is not configured.")
             return Response(
                 {"detail": "Webhook secret not configured."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -286,81 +424,31 @@ class StripeWebhookView(views.APIView):
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
         except ValueError as e:
-            print(f"❌ Webhook Error: Invalid payload. {e}")
+            logger.warning("Webhook error: invalid payload (%s)", e)
             return Response({"detail": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST)
         except stripe.SignatureVerificationError as e:
-            print(f"❌ Webhook Error: Invalid signature. {e}")
+            logger.warning("Webhook error: invalid signature (%s)", e)
             return Response({"detail": "Invalid signature"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # --- Step 2: Handle different Stripe events ---
-        event_type = event.get("type")
-        payment_intent = event["data"]["object"]
-        payment_id = payment_intent.get("metadata", {}).get("payment_id")
-
-        if not payment_id:
-            print(f"❌ Webhook Error: payment_id not found in metadata for intent {payment_intent.get('id')}")
+        # --- Step 2: Apply the payment/order transition (a batch of one) ---
+        payment_event = payment_event_from_stripe(event)
+        if payment_event is None:
+            # Unhandled event types ('charge.refunded', ...) or intents without our metadata
+            if event.get("type") in PAYMENT_TRANSITIONS:
+                logger.warning(
+                    "Webhook error: payment_id missing from metadata of intent %s",
+                    event["data"]["object"].get("id"),
+                    extra={"stripe_event_type": event.get("type")}
+                )
             return Response(status=status.HTTP_200_OK)  # Always respond 200 to Stripe
 
-        if event_type == "payment_intent.succeeded":
-            self.handle_payment_succeeded(payment_id, payment_intent.get("id"))
-
-        elif event_type == "payment_intent.payment_failed":
-            self.handle_payment_failed(payment_id)
-
-        # You can handle more events like 'charge.refunded' here later if needed
+        try:
+            apply_payment_events([payment_event])
+        except Exception:
+            logger.exception(
+                "Webhook error while applying payment event",
+                extra={"payment_id": payment_event.payment_id, "stripe_event_type": payment_event.event_type}
+            )
 
         # --- Step 3: Respond success to Stripe ---
         return Response(status=status.HTTP_200_OK)
-
-    # --------------------------------------------------
-    # Helper Methods
-    # --------------------------------------------------
-
-    def handle_payment_succeeded(self, payment_id, stripe_pi_id):
-        """Handles successful payment events."""
-        try:
-            with transaction.atomic():
-                payment = Payment.objects.select_for_update().get(id=payment_id)
-
-                if payment.status == Payment.Status.PENDING:
-                    # Update Payment
-                    payment.status = Payment.Status.SUCCEEDED
-                    payment.stripe_payment_intent_id = stripe_pi_id
-                    payment.save(update_fields=["status", "stripe_payment_intent_id"])
-
-                    # Update Order
-                    order = payment.order
-                    order.status = OrderStatus.COMPLETED
-                    order.save(update_fields=["status"])
-
-                    print(f"✅ Payment succeeded for Order {order.id}. Status set to COMPLETED.")
-                    # (Optional: trigger email, send notification, etc.)
-
-        except Payment.DoesNotExist:
-            print(f"❌ Webhook Error: Payment with ID {payment_id} not found.")
-        except Exception as e:
-            print(f"❌ Webhook Error (Succeeded): {str(e)}")
-
-    def handle_payment_failed(self, payment_id):
-        """Handles failed payment events."""
-        try:
-            with transaction.atomic():
-                payment = Payment.objects.select_for_update().get(id=payment_id)
-
-                if payment.status == Payment.Status.PENDING:
-                    # Update Payment
-                    payment.status = Payment.Status.FAILED
-                    payment.save(update_fields=["status"])
-
-                    # Update Order
-                    order = payment.order
-                    order.status = OrderStatus.FAILED
-                    order.save(update_fields=["status"])
-
-                    print(f"❌ Payment failed for Order {order.id}. Status set to FAILED.")
-                    # (Optional: restore stock, send notification, etc.)
-
-        except Payment.DoesNotExist:
-            print(f"❌ Webhook Error: Payment with ID {payment_id} not found.")
-        except Exception as e:
-            print(f"❌ Webhook Error (Failed): {str(e)}")
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .inventory import set_stock
 from .models import Product, Category
 
 
@@ -7,7 +8,8 @@ class CategoryAdmin(admin.ModelAdmin):
     """Admin configuration for the Category model."""
     
     # Display these fields in the list view
-    list_display = ("name", "slug")
+    list_display = ("name", "slug", "parent", "product_count", "in_stock_count")
+    list_select_related = ("parent",)
     
     # Enable search by category name
     search_fields = ("name",)
@@ -15,6 +17,9 @@ class CategoryAdmin(admin.ModelAdmin):
     # Auto-generate slug from the name
     prepopulated_fields = {"slug": ("name",)}
 
+    # Tree position and counters are maintained automatically
+    readonly_fields = ("path", "product_count", "in_stock_count")
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -22,6 +27,7 @@ class ProductAdmin(admin.ModelAdmin):
     
     # Columns displayed in the list view
     list_display = ("name", "price", "stock", "category", "updated_at")
+    list_select_related = ("category",)
     
     # Filters shown in the right sidebar
     list_filter = ("category", "updated_at")
@@ -32,9 +38,15 @@ class ProductAdmin(admin.ModelAdmin):
     # Optional: group fields in the form view
     fieldsets = (
         ("Basic Info", {"fields": ("name", "category", "description")}),
-        ("Pricing & Stock", {"fields": ("price", "stock")}),
+        ("Pricing & Stock", {"fields": ("price", "stock", "stock_shards")}),
         ("Metadata", {"fields": ("updated_at",)}),
     )
     
-    # Make 'updated_at' read-only
-    readonly_fields = ("updated_at",)
+    # Make 'updated_at' read-only; sharding is switched with `manage.py shard_stock`
+    readonly_fields = ("updated_at", "stock_shards")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A new stock level for a sharded product is spread over its shards
+        if change and obj.stock_shards and "stock" in form.changed_data:
+            set_stock(obj.pk, obj.stock)
@@ -0,0 +1,35 @@
+"""
+Cache keys and invalidation for catalog data served from Django's cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATEGORY_LIST_KEY = "products:categories:list"
+CATEGORY_TREE_KEY = "products:categories:tree"
+PRODUCT_KEY = "products:product:{pk}"
+
+
+def category_cache_timeout():
+    return getattr(settings, "CATEGORY_CACHE_TIMEOUT", 60 * 60)
+
+
+def invalidate_category_cache():
+    """Drop cached category listings once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete_many([CATEGORY_LIST_KEY, CATEGORY_TREE_KEY]))
+
+
+def product_cache_key(pk):
+    return PRODUCT_KEY.format(pk=pk)
+
+
+def product_cache_timeout():
+    return getattr(settings, "PRODUCT_CACHE_TIMEOUT", 15 * 60)
+
+
+def invalidate_product_cache(product_ids):
+    """Drop cached product representations once the current transaction commits."""
+    keys = [product_cache_key(pk) for pk in product_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
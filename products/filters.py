@@ -0,0 +1,85 @@
+"""
+Product filtering and facet counts for storefront listings.
+"""
+from decimal import Decimal
+
+import django_filters
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+
+from .models import Product, units_in_stock
+
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_FACET_BOUNDS = (Decimal(25), Decimal(50), Decimal(100), Decimal(250))
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    """Comma-separated list filter, e.g. ?category=shoes,hats"""
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filters for the product listing:
+    price ranges, in-stock only, several categories and creation date.
+    """
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    category = CharInFilter(field_name='category__slug', lookup_expr='in')
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+
+    class Meta:
+        model = Product
+        # Exact-match filters kept for existing clients
+        fields = ['category__slug', 'price', 'stock']
+
+    def filter_in_stock(self, queryset, name, value):
+        # The shard total for sharded products, whose `stock` column is only a snapshot
+        queryset = queryset.alias(units=units_in_stock())
+        return queryset.filter(units__gt=0) if value else queryset.filter(units=0)
+
+
+def product_facets(queryset):
+    """
+    Return category, price-bucket and availability counts for `queryset`.
+
+    All three facets come from one grouped aggregate query and are rolled
+    up in Python.
+    """
+    price_bucket = Case(
+        *[When(price__lt=bound, then=Value(i)) for i, bound in enumerate(PRICE_FACET_BOUNDS)],
+        default=Value(len(PRICE_FACET_BOUNDS)),
+        output_field=IntegerField(),
+    )
+    available = Case(When(units__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField())
+
+    rows = (
+        queryset.order_by()
+        .alias(units=units_in_stock())
+        .annotate(price_bucket=price_bucket, available=available)
+        .values('category__slug', 'category__name', 'price_bucket', 'available')
+        .annotate(total=Count('pk'))
+    )
+
+    categories, buckets = {}, [0] * (len(PRICE_FACET_BOUNDS) + 1)
+    availability = {'in_stock': 0, 'out_of_stock': 0}
+    for row in rows:
+        slug = row['category__slug']
+        if slug is not None:
+            entry = categories.setdefault(slug, {'slug': slug, 'name': row['category__name'], 'count': 0})
+            entry['count'] += row['total']
+        buckets[row['price_bucket']] += row['total']
+        availability['in_stock' if row['available'] else 'out_of_stock'] += row['total']
+
+    # Bounds are rendered as strings, like the serialized prices
+    bounds = [str(bound) for bound in PRICE_FACET_BOUNDS]
+    lower_bounds = [None] + bounds
+    upper_bounds = bounds + [None]
+    return {
+        'categories': sorted(categories.values(), key=lambda entry: entry['name']),
+        'price': [
+            {'min': low, 'max': high, 'count': count}
+            for low, high, count in zip(lower_bounds, upper_bounds, buckets, strict=True)
+        ],
+        'availability': availability,
+    }
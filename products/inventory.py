@@ -0,0 +1,230 @@
+"""
+Stock keeping, with an optional sharded mode for flash-sale products.
+
+Normally a product's stock is its `stock` column, decremented at checkout by
+one guarded UPDATE. During a flash sale, every checkout of one product then
+queues on that single row lock. A product flagged with
+`manage.py shard_stock <id> --shards N` keeps its stock in N `StockShard`
+rows instead. A checkout locks one shard, starting at a random one and
+skipping shards other checkouts hold (`SKIP LOCKED`), so up to N checkouts
+of the product proceed in parallel. Only when the free shards can't cover a
+quantity does it wait for the locked ones.
+
+Reads of a sharded product sum its shards (`Product.available_stock`, and
+`units_in_stock()` for the in-stock filter, facets and category counters).
+Its `stock` column becomes a snapshot, refreshed by
+`manage.py shard_stock --sync`. That run also recounts categories whose
+sell-out two concurrent checkouts missed. Each of those checkouts saw the
+other's last unit, which was not yet committed.
+
+`release_stock()` puts the units of a cancelled or failed order back.
+These UPDATEs bypass `Product.save()`, so they send `stock_changed` for
+the views that show stock (such as cached carts) to drop their copies.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import invalidate_category_cache, invalidate_product_cache
+from .models import Category, Product, StockShard, shard_total
+from .signals import stock_changed
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough stock."
+    default_code = "out_of_stock"
+
+    def __init__(self, product):
+        super().__init__(f"Not enough stock for {product.name}.")
+
+
+def with_available_stock(queryset, through=None):
+    """
+    Annotate `sharded_stock` (only computed for sharded products) for `Product.available_stock`.
+    On another model's queryset, `through` names its product foreign key and the annotation is
+    `<through>_sharded_stock`, for the caller to copy onto the related product.
+    """
+    if through is None:
+        return queryset.annotate(
+            sharded_stock=Case(When(stock_shards__gt=0, then=shard_total()), output_field=IntegerField())
+        )
+    return queryset.annotate(**{
+        f'{through}_sharded_stock': Case(
+            When(**{f'{through}__stock_shards__gt': 0}, then=shard_total(f'{through}_id')),
+            output_field=IntegerField(),
+        )
+    })
+
+
+def spread(total, shards):
+    """Split `total` units as evenly as possible across `shards` counters."""
+    base, extra = divmod(total, shards)
+    return [base + 1 if index < extra else base for index in range(shards)]
+
+
+@transaction.atomic
+def set_stock(product_id, quantity=None, shards=None):
+    """
+    Rewrite a product's stock as `quantity` units (default: what it has now)
+    in `shards` counters (default: its current count; 0 turns sharding off).
+    """
+    product = Product.objects.select_for_update().get(pk=product_id)
+    rows = list(StockShard.objects.select_for_update().filter(product=product))
+    if quantity is None:
+        quantity = sum(row.quantity for row in rows) if product.stock_shards else product.stock
+    if shards is None:
+        shards = product.stock_shards
+
+    StockShard.objects.filter(product=product).delete()
+    StockShard.objects.bulk_create([
+        StockShard(product=product, shard=index, quantity=units)
+        for index, units in enumerate(spread(quantity, shards) if shards else [])
+    ])
+    product.stock, product.stock_shards = quantity, shards
+    # A normal save, so category counters and cached copies follow
+    product.save(update_fields=['stock', 'stock_shards', 'updated_at'])
+    return product
+
+
+def _by_product(lines):
+    """{pk: (product, total quantity)} from (product, quantity) lines."""
+    quantities = {}
+    for product, quantity in lines:
+        product, total = quantities.get(product.pk, (product, 0))
+        quantities[product.pk] = (product, total + quantity)
+    return quantities
+
+
+def _per_product(quantities):
+    """`CASE pk WHEN ... THEN quantity END` for an UPDATE over several products."""
+    return Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, (_, quantity) in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def take_stock(lines):
+    """
+    Remove the (product, quantity) `lines` from stock inside the caller's
+    transaction, or raise OutOfStock. Unsharded products are decremented by
+    one guarded UPDATE, however many there are.
+    """
+    quantities = _by_product(lines)
+    sold_out = set()
+
+    plain = {pk: line for pk, line in quantities.items() if not line[0].stock_shards}
+    if plain:
+        # Lock the rows in pk order, so checkouts sharing products can't deadlock, and read the
+        # stock they hold now: the products in `lines` may have been loaded before other checkouts
+        locked = {
+            pk: (stock, category_id)
+            for pk, stock, category_id in Product.objects.select_for_update()
+            .filter(pk__in=plain).order_by('pk').values_list('pk', 'stock', 'category_id')
+        }
+        wanted = _per_product(plain)
+        taken = Product.objects.filter(pk__in=plain, stock__gte=wanted).update(stock=F('stock') - wanted)
+        if taken != len(plain):
+            short = Product.objects.filter(pk__in=plain, stock__lt=wanted).values_list('pk', flat=True).first()
+            raise OutOfStock(plain.get(short, next(iter(plain.values())))[0])
+        # The UPDATE bypassed the counter-keeping signals; recount where it took the last units
+        sold_out = {
+            category_id for pk, (stock, category_id) in locked.items() if stock <= plain[pk][1]
+        }
+
+    # Sorted, so concurrent checkouts that fall back to waiting lock shards in the same order
+    for pk in sorted(quantities.keys() - plain.keys()):
+        product, quantity = quantities[pk]
+        _take_from_shards(product, quantity)
+        # Whether the product sold out is only known once its shards are taken from
+        if not StockShard.objects.filter(product_id=pk, quantity__gt=0).exists():
+            sold_out.add(product.category_id)
+
+    if sold_out:
+        Category.refresh_product_counts(sold_out)
+        invalidate_category_cache()
+    invalidate_product_cache(list(quantities))
+    stock_changed.send(sender=Product, product_ids=list(quantities))
+
+
+def release_stock(lines):
+    """
+    Put the (product, quantity) `lines` back into stock inside the caller's
+    transaction; the inverse of `take_stock()`, for orders that are cancelled
+    or fail after checkout took their units.
+    """
+    quantities = _by_product(lines)
+    if not quantities:
+        return
+
+    plain = {pk: line for pk, line in quantities.items() if not line[0].stock_shards}
+    if plain:
+        added = _per_product(plain)
+        Product.objects.filter(pk__in=plain).update(stock=F('stock') + added)
+    for pk in sorted(quantities.keys() - plain.keys()):
+        product, quantity = quantities[pk]
+        # Any shard will do; a random one spreads concurrent releases, as checkouts are spread
+        shard = random.randrange(product.stock_shards)
+        StockShard.objects.filter(product_id=pk, shard=shard).update(quantity=F('quantity') + quantity)
+
+    # Not a hot path: recount every category involved rather than guess which came back in stock
+    Category.refresh_product_counts({product.category_id for product, _ in quantities.values()})
+    invalidate_category_cache()
+    invalidate_product_cache(list(quantities))
+    stock_changed.send(sender=Product, product_ids=list(quantities))
+
+
+def _take_from_shards(product, quantity):
+    remaining = quantity
+    used = []
+    start = random.randrange(product.stock_shards)
+    # Walk the shards from a random one so concurrent checkouts spread out
+    position = Case(
+        When(shard__lt=start, then=F('shard') + product.stock_shards),
+        default=F('shard'),
+        output_field=IntegerField(),
+    )
+    for skip_locked in (True, False):
+        while remaining:
+            shard = (
+                StockShard.objects
+                .select_for_update(skip_locked=skip_locked)
+                .filter(product_id=product.pk, quantity__gt=0)
+                .exclude(pk__in=used)
+                .order_by(position if skip_locked else 'shard')
+                .first()
+            )
+            if shard is None:
+                break
+            units = min(shard.quantity, remaining)
+            StockShard.objects.filter(pk=shard.pk).update(quantity=F('quantity') - units)
+            used.append(shard.pk)
+            remaining -= units
+        if not remaining:
+            return
+    raise OutOfStock(product)
+
+
+def sync_stock_snapshots():
+    """Copy each sharded product's shard total into its `stock` column; return products changed."""
+    totals = dict(
+        StockShard.objects.filter(product__stock_shards__gt=0)
+        .values('product').annotate(total=Sum('quantity')).values_list('product', 'total')
+    )
+    products = Product.objects.filter(stock_shards__gt=0).only('pk', 'stock', 'category_id')
+    changed = []
+    for product in products:
+        total = totals.get(product.pk, 0)
+        if product.stock != total:
+            product.stock = total
+            changed.append(product)
+    with transaction.atomic():
+        Product.objects.bulk_update(changed, ['stock'])
+        Category.refresh_product_counts({product.category_id for product in changed})
+        invalidate_category_cache()
+        invalidate_product_cache([product.pk for product in changed])
+        stock_changed.send(sender=Product, product_ids=[product.pk for product in changed])
+    return len(changed)
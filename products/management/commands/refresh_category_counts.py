@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import invalidate_category_cache
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized product counters of every category (e.g. after bulk imports)."
+
+    def handle(self, *args, **options):
+        category_ids = list(Category.objects.values_list("pk", flat=True))
+        Category.refresh_product_counts(category_ids)
+        invalidate_category_cache()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed counters for {len(category_ids)} categories."))
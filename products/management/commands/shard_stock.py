@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from products.inventory import set_stock, sync_stock_snapshots
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Move flash-sale products' stock into sharded counters (--shards 0 merges it back), "
+        "or refresh the stock column of sharded products with --sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="*", type=int, help="Products to (un)shard.")
+        parser.add_argument(
+            "--shards", type=int, default=settings.STOCK_SHARDS,
+            help="Counter rows per product; 0 turns sharding off.",
+        )
+        parser.add_argument(
+            "--sync", action="store_true",
+            help="Copy shard totals into Product.stock for the catalog filters and category counts.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["product_ids"] and not options["sync"]:
+            raise CommandError("Give product ids to shard, or --sync.")
+        if options["shards"] < 0:
+            raise CommandError("--shards must be 0 or more.")
+
+        for product_id in options["product_ids"]:
+            try:
+                product = set_stock(product_id, shards=options["shards"])
+            except Product.DoesNotExist as e:
+                raise CommandError(f"Product {product_id} does not exist.") from e
+            mode = f"{product.stock_shards} shards" if product.stock_shards else "a single row"
+            self.stdout.write(f"{product.name}: {product.stock} units in {mode}.")
+
+        if options["sync"]:
+            changed = sync_stock_snapshots()
+            self.stdout.write(self.style.SUCCESS(f"Refreshed stock of {changed} sharded products."))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_paths_and_counts(apps, schema_editor):
+    """Existing categories are all roots; compute their paths and product counters."""
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.annotate(
+        products_total=Count('products'),
+        products_in_stock=Count('products', filter=Q(products__stock__gt=0)),
+    ))
+    for category in categories:
+        category.path = f"{category.slug}/"
+        category.product_count = category.products_total
+        category.in_stock_count = category.products_in_stock
+    Category.objects.bulk_update(categories, ['path', 'product_count', 'in_stock_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_category_product_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_paths_and_counts, migrations.RunPython.noop),
+    ]
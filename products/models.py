@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.utils.text import slugify
 
 
@@ -6,18 +8,67 @@ class Category(models.Model):
     """Represents a category for grouping products."""
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
+    # Adjacency list plus materialized path ("shoes/running/") for cheap subtree queries
+    parent = models.ForeignKey(
+        'self',
+        related_name='children',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True)
+    path = models.CharField(max_length=1024, db_index=True, editable=False, default='')
+
+    # Denormalized counters, maintained by products.signals on product writes
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:                  # Meta options for the Category model
         ordering = ['name']
         verbose_name = "Category"
         verbose_name_plural = "Categories"
 
+    def build_path(self):
+        """Return the materialized path for the current parent and slug."""
+        prefix = self.parent.path if self.parent_id else ''
+        return f"{prefix}{self.slug}/"
+
     def save(self, *args, **kwargs):         # Override save method to auto-generate slug
-        """Auto-generate slug from name if not provided."""
+        """Auto-generate slug from name if not provided and keep paths in sync."""
         if not self.slug:
             self.slug = slugify(self.name)
+        old_path = self.path
+        self.path = self.build_path()
         super().save(*args, **kwargs)
 
+        # Re-root every descendant in one UPDATE when this node moved or was renamed
+        if old_path and old_path != self.path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1))
+            )
+
+    @classmethod
+    def refresh_product_counts(cls, category_ids):
+        """Recompute product_count and in_stock_count for the given categories in one UPDATE."""
+        category_ids = {pk for pk in category_ids if pk is not None}
+        if not category_ids:
+            return
+
+        def count_of(products):
+            return Coalesce(
+                Subquery(
+                    products.filter(category=OuterRef('pk'))
+                    .order_by()
+                    .values('category')
+                    .annotate(total=Count('pk'))
+                    .values('total')
+                ),
+                0,
+            )
+
+        cls.objects.filter(pk__in=category_ids).update(
+            product_count=count_of(Product.objects.all()),
+            in_stock_count=count_of(Product.objects.alias(units=units_in_stock()).filter(Q(units__gt=0))),
+        )
+
     def __str__(self):
         return self.name
 
@@ -34,14 +85,74 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Flash-sale mode: >0 means stock lives in that many StockShard rows (see products/inventory.py)
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:                                # Meta options for the Product model
         ordering = ['-created_at']
+        # Back the listing filters: category + price range, price range, newest first
+        indexes = [
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['-created_at'], name='product_created_at_idx'),
+        ]
         verbose_name = "Product"
         verbose_name_plural = "Products"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember loaded column values so signal handlers can detect changes."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values, strict=True))
+        return instance
+
+    @property
+    def available_stock(self):
+        """Units left: `stock`, or the sum of the shards for sharded products."""
+        if not self.stock_shards:
+            return self.stock
+        # Catalog querysets annotate the sum (inventory.with_available_stock)
+        if hasattr(self, 'sharded_stock'):
+            return self.sharded_stock or 0
+        return self.shards.aggregate(total=Sum('quantity'))['total'] or 0
+
     def __str__(self):                         # String representation of the Product model
-        return f"{self.name} — ${self.price:,.2f}"
\ No newline at end of file
+        return f"{self.name} — ${self.price:,.2f}"
+
+
+class StockShard(models.Model):
+    """One of the counter rows holding a sharded product's stock."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stock_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of product {self.product_id}: {self.quantity}"
+
+
+def shard_total(product='pk'):
+    """Subquery: the summed StockShard quantities of the outer query's `product` (NULL without shards)."""
+    return Subquery(
+        StockShard.objects.filter(product=OuterRef(product))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+
+
+def units_in_stock():
+    """Expression for a product's units left: its shard total when sharded, else `stock`."""
+    return Case(
+        When(stock_shards__gt=0, then=Coalesce(shard_total(), 0)),
+        default=F('stock'),
+        output_field=IntegerField(),
+    )
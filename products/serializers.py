@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .inventory import set_stock
 from .models import Product, Category
 
 
@@ -6,8 +7,14 @@ class CategorySerializer(serializers.ModelSerializer):
     """Handles serialization and deserialization of Category objects."""
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug']
-        read_only_fields = ['slug']
+        fields = ['id', 'name', 'slug', 'parent', 'path', 'product_count', 'in_stock_count']
+        read_only_fields = ['slug', 'path', 'product_count', 'in_stock_count']
+
+    def validate_parent(self, parent):
+        """Reject parents that would turn the tree into a cycle."""
+        if parent and self.instance and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be nested under itself or its descendants.")
+        return parent
 
 class ProductSerializer(serializers.ModelSerializer):
     """Serializer for Product model."""
@@ -21,3 +28,19 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'category_id', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Sharded products report the sum of their stock shards
+        sparse_dependencies = {'stock': ['stock', 'stock_shards']}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'stock' in data and instance.stock_shards:
+            data['stock'] = instance.available_stock
+        return data
+
+    def update(self, instance, validated_data):
+        # A new stock level for a sharded product is spread over its shards
+        stock = validated_data.pop('stock') if instance.stock_shards and 'stock' in validated_data else None
+        instance = super().update(instance, validated_data)
+        if stock is not None:
+            instance = set_stock(instance.pk, stock)
+        return instance
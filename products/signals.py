@@ -0,0 +1,58 @@
+"""
+Keeps denormalized category counters and cached listings in sync with
+product and category writes.
+
+Bulk operations (`bulk_create`, `QuerySet.update`) bypass these handlers;
+run `manage.py refresh_category_counts` after bulk imports.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .cache import invalidate_category_cache, invalidate_product_cache
+from .models import Category, Product
+
+
+# Sent with `product_ids` by products.inventory, whose UPDATEs change stock without a save()
+stock_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    """Recount the old and new category when membership or availability changed."""
+    if not created:
+        invalidate_product_cache([instance.pk])
+
+    loaded = getattr(instance, "_loaded_values", {})
+    old_category_id = loaded.get("category_id")
+
+    # Fields still deferred (loaded with only()/defer()) were not saved, so they didn't change
+    deferred = instance.get_deferred_fields()
+    category_changed = "category_id" not in deferred and (
+        "category_id" not in loaded or old_category_id != instance.category_id
+    )
+    stock_changed = "stock" not in deferred and (
+        "stock" not in loaded or (loaded["stock"] > 0) != (instance.stock > 0)
+    )
+    if not created and not category_changed and not stock_changed:
+        return
+
+    Category.refresh_product_counts({old_category_id, instance.category_id})
+    invalidate_category_cache()
+
+    # Later saves of the same instance compare against what is now stored
+    instance._loaded_values = {**loaded, "category_id": instance.category_id, "stock": instance.stock}
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_product_cache([instance.pk])
+    Category.refresh_product_counts({instance.category_id})
+    invalidate_category_cache()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_category_cache()
+    # Cached products embed their category
+    invalidate_product_cache(Product.objects.filter(category_id=instance.pk).values_list("pk", flat=True))
@@ -1,3 +1,311 @@
-from django.test import TestCase
+from decimal import Decimal
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from config.testing import QueryCountScalingMixin
+from .inventory import OutOfStock, release_stock, set_stock, take_stock
+from .models import Category, Product, StockShard
+
+
+def make_products(count, category=None, prefix="Product"):
+    """Create `count` products in one INSERT."""
+    return Product.objects.bulk_create([
+        Product(
+            name=f"{prefix} {i}",
+            description="Description",
+            price=Decimal("9.99"),
+            stock=5,
+            category=category,
+        )
+        for i in range(count)
+    ])
+
+
+class CatalogQueryCountTests(QueryCountScalingMixin, APITestCase):
+    """Catalog endpoints must not issue per-row queries."""
+
+    def test_product_list(self):
+        def build(scale):
+            category = Category.objects.create(name="Shoes")
+            make_products(scale, category=category)
+
+        self.assertConstantQueries(build, lambda _: self.client.get(reverse("product-list")))
+
+    def test_category_list(self):
+        def build(scale):
+            for i in range(scale):
+                category = Category.objects.create(name=f"Category {i}")
+                make_products(2, category=category, prefix=f"Category {i} product")
+
+        self.assertConstantQueries(build, lambda _: self.client.get(reverse("category-list")))
+
+
+class CategoryTreeTests(APITestCase):
+    """Materialized paths, denormalized counters and the cached listing."""
+
+    def setUp(self):
+        cache.clear()
+        self.shoes = Category.objects.create(name="Shoes")
+        self.running = Category.objects.create(name="Running", parent=self.shoes)
+
+    def test_paths_follow_parent(self):
+        self.assertEqual(self.running.path, "shoes/running/")
+
+        trail = Category.objects.create(name="Trail", parent=self.running)
+        self.shoes.slug = "footwear"
+        self.shoes.save()
+        trail.refresh_from_db()
+        self.assertEqual(trail.path, "footwear/running/trail/")
+
+    def test_counts_follow_product_writes(self):
+        product = Product.objects.create(name="Racer", price=Decimal("50.00"), stock=0, category=self.running)
+        self.running.refresh_from_db()
+        self.assertEqual((self.running.product_count, self.running.in_stock_count), (1, 0))
+
+        product = Product.objects.get(pk=product.pk)
+        product.stock = 3
+        product.category = self.shoes
+        product.save()
+        self.running.refresh_from_db()
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.running.product_count, self.running.in_stock_count), (0, 0))
+        self.assertEqual((self.shoes.product_count, self.shoes.in_stock_count), (1, 1))
+
+        product.delete()
+        self.shoes.refresh_from_db()
+        self.assertEqual(self.shoes.product_count, 0)
+
+    def test_listing_is_cached_and_invalidated(self):
+        self.client.get(reverse("category-list"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("category-list"))
+        self.assertEqual(len(response.data), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Hats")
+        self.assertEqual(len(self.client.get(reverse("category-list")).data), 3)
+
+    def test_tree_nests_children(self):
+        response = self.client.get(reverse("category-tree"))
+        self.assertEqual([node["slug"] for node in response.data], ["shoes"])
+        self.assertEqual([node["slug"] for node in response.data[0]["children"]], ["running"])
+
+
+class ProductFilterTests(APITestCase):
+    """Range/multi-value filters and facet counts on the product listing."""
+
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.hats = Category.objects.create(name="Hats")
+        Product.objects.create(name="Sandal", price=Decimal("20.00"), stock=0, category=self.shoes)
+        Product.objects.create(name="Boot", price=Decimal("120.00"), stock=4, category=self.shoes)
+        Product.objects.create(name="Cap", price=Decimal("30.00"), stock=9, category=self.hats)
+
+    def names(self, response):
+        return sorted(product["name"] for product in response.data)
+
+    def test_price_range_and_stock(self):
+        url = reverse("product-list")
+        self.assertEqual(self.names(self.client.get(url, {"min_price": 25, "max_price": 150})), ["Boot", "Cap"])
+        self.assertEqual(self.names(self.client.get(url, {"in_stock": "true"})), ["Boot", "Cap"])
+
+    def test_multiple_categories(self):
+        response = self.client.get(reverse("product-list"), {"category": "hats,shoes", "max_price": 25})
+        self.assertEqual(self.names(response), ["Sandal"])
+
+    def test_facets_come_from_one_query(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("product-list"), {"facets": "true"})
+
+        facets = response.data["facets"]
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(
+            [(entry["slug"], entry["count"]) for entry in facets["categories"]],
+            [("hats", 1), ("shoes", 2)],
+        )
+        self.assertEqual([bucket["count"] for bucket in facets["price"]], [1, 1, 0, 1, 0])
+        self.assertEqual(facets["availability"], {"in_stock": 2, "out_of_stock": 1})
+
+
+class ProductBatchTests(APITestCase):
+    """Batch lookup returns products in request order, cache first."""
+
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3, category=Category.objects.create(name="Bags"))
+        self.url = reverse("product-batch")
+
+    def test_request_order_and_not_found_markers(self):
+        first, _, third = self.products
+        ids = f"{third.id},999999,{first.id},{third.id}"
+        response = self.client.get(self.url, {"ids": ids})
+
+        results = response.data["results"]
+        self.assertEqual([entry["id"] for entry in results], [third.id, 999999, first.id, third.id])
+        self.assertEqual(results[1]["detail"], "Not found.")
+        self.assertEqual(results[0]["category"]["name"], "Bags")
+
+    def test_cached_products_skip_the_database(self):
+        ids = ",".join(str(product.id) for product in self.products)
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {"ids": ids})
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {"ids": ids})
+
+    def test_sparse_request_does_not_poison_the_cache(self):
+        ids = ",".join(str(product.id) for product in self.products)
+        sparse = self.client.get(self.url, {"ids": ids, "fields": "id,category", "expand": ""}).data["results"]
+        self.assertEqual(sparse[0], {"id": self.products[0].id, "category": self.products[0].category_id})
+
+        with self.assertNumQueries(0):
+            full = self.client.get(self.url, {"ids": ids}).data["results"]
+        self.assertEqual(full[0]["category"]["name"], "Bags")
+        self.assertIn("price", full[0])
+
+        with self.assertNumQueries(0):
+            named = self.client.get(self.url, {"ids": ids, "fields": "name"}).data["results"]
+        self.assertEqual(named[0], {"name": self.products[0].name})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {"ids": self.products[0].id, "fields": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_update_invalidates_its_entry(self):
+        product = self.products[0]
+        self.client.get(self.url, {"ids": product.id})
+        product = Product.objects.get(pk=product.pk)
+        product.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(self.url, {"ids": product.id}).data["results"][0]["name"], "Renamed")
+
+    def test_rejects_bad_or_oversized_input(self):
+        self.assertEqual(self.client.get(self.url, {"ids": "1,x"}).status_code, 400)
+        with self.settings(PRODUCT_BATCH_MAX_IDS=2):
+            self.assertEqual(self.client.get(self.url, {"ids": "1,2,3"}).status_code, 400)
+
+
+class SparseFieldsetTests(APITestCase):
+    """?fields= / ?expand= prune both the response and the loaded columns."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Lamps")
+        self.product = make_products(1, category=self.category)[0]
+        self.url = reverse("product-list")
+
+    def test_fields_prune_response_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"fields": "id,name,price"})
+
+        self.assertEqual(list(response.data[0]), ["id", "name", "price"])
+        sql = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("products_category", sql)
+
+    def test_nested_objects_collapse_unless_expanded(self):
+        collapsed = self.client.get(self.url, {"fields": "id,category"}).data[0]
+        self.assertEqual(collapsed["category"], self.category.id)
+
+        expanded = self.client.get(self.url, {"fields": "id,category", "expand": "category"}).data[0]
+        self.assertEqual(expanded["category"]["name"], "Lamps")
+
+        with self.assertNumQueries(1):
+            dotted = self.client.get(self.url, {"fields": "id,category.slug"}).data[0]
+        self.assertEqual(dotted["category"], {"slug": "lamps"})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_saving_a_deferred_instance_keeps_counters(self):
+        Category.refresh_product_counts([self.category.id])
+        product = Product.objects.only("id", "name").get(pk=self.product.pk)
+        product.name = "Renamed"
+        # Just the UPDATE: deferred stock/category are neither loaded nor recounted
+        with self.assertNumQueries(1):
+            product.save()
+        self.category.refresh_from_db()
+        self.assertEqual((self.category.product_count, self.category.in_stock_count), (1, 1))
+
+
+class ShardedStockTests(APITestCase):
+    """Flash-sale products keep their stock in counter shards, summed for display."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Consoles")
+        self.product = Product.objects.create(name="Console", price=Decimal("499.00"), stock=10, category=self.category)
+        call_command("shard_stock", str(self.product.pk), "--shards", "4", stdout=StringIO())
+        self.product.refresh_from_db()
+
+    def shards(self):
+        return list(StockShard.objects.filter(product=self.product).order_by("shard").values_list("quantity", flat=True))
+
+    def test_sharding_spreads_and_reads_sum(self):
+        self.assertEqual(self.shards(), [3, 3, 2, 2])
+        StockShard.objects.filter(product=self.product, shard=0).update(quantity=0)
+
+        with self.assertNumQueries(1):  # the shard sum is part of the listing query
+            listed = self.client.get(reverse("product-list")).data[0]
+        detail = self.client.get(reverse("product-detail", kwargs={"pk": self.product.pk})).data
+        self.assertEqual((listed["stock"], detail["stock"]), (7, 7))
+
+    def test_take_stock_spans_shards_or_fails_whole(self):
+        with transaction.atomic():
+            take_stock([(self.product, 4), (self.product, 1)])
+        self.assertEqual(sum(self.shards()), 5)
+
+        with self.assertRaises(OutOfStock), transaction.atomic():
+            take_stock([(self.product, 6)])
+        self.assertEqual(sum(self.shards()), 5)
+
+    def test_sync_and_unshard(self):
+        with transaction.atomic():
+            take_stock([(self.product, 10)])
+        call_command("shard_stock", "--sync", stdout=StringIO())
+        self.category.refresh_from_db()
+        self.assertEqual((Product.objects.get(pk=self.product.pk).stock, self.category.in_stock_count), (0, 0))
+
+        set_stock(self.product.pk, 6)
+        call_command("shard_stock", str(self.product.pk), "--shards", "0", stdout=StringIO())
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stock, product.stock_shards, self.shards()), (6, 0, []))
+
+    def test_release_stock_is_the_inverse_of_take(self):
+        with transaction.atomic():
+            take_stock([(self.product, 10)])
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.in_stock_count, 0)
+
+        with transaction.atomic():
+            release_stock([(self.product, 4)])
+        self.category.refresh_from_db()
+        self.assertEqual((sum(self.shards()), self.category.in_stock_count), (4, 1))
+
+    def test_catalog_reads_shard_totals_not_the_snapshot(self):
+        StockShard.objects.filter(product=self.product).update(quantity=0)  # the snapshot still says 10
+        url = reverse("product-list")
+
+        self.assertEqual(self.client.get(url, {"in_stock": "true"}).data, [])
+        self.assertEqual([p["id"] for p in self.client.get(url, {"in_stock": "false"}).data], [self.product.pk])
+        facets = self.client.get(url, {"facets": "true"}).data["facets"]
+        self.assertEqual(facets["availability"], {"in_stock": 0, "out_of_stock": 1})
+
+        Category.refresh_product_counts([self.category.pk])
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.in_stock_count, 0)
+
+    def test_api_stock_update_respreads(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username="ops", password="pass12345"))
+        response = self.client.patch(reverse("product-detail", kwargs={"pk": self.product.pk}), {"stock": 8})
+        self.assertEqual((response.status_code, response.data["stock"]), (200, 8))
+        self.assertEqual(self.shards(), [2, 2, 2, 2])
 
-# Create your tests here.
@@ -1,17 +1,34 @@
-from rest_framework import viewsets, permissions, filters
+from django.apps import apps
+from django.conf import settings
+from django.http import Http404
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.core.cache import cache
 from django_filters.rest_framework import DjangoFilterBackend
+from core.compression import cache_compressed
+from core.sparse import SparseFieldsetMixin, prune_representation, restrict_queryset
+from .filters import ProductFilter, product_facets
+from .inventory import with_available_stock
+from .cache import CATEGORY_LIST_KEY, CATEGORY_TREE_KEY, category_cache_timeout
+from .cache import product_cache_key, product_cache_timeout
 from .models import Product, Category
 from .serializers import ProductSerializer, CategorySerializer
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing products.
 
     Features:
-    - Supports filtering by category, price, and stock
+    - Supports filtering by price range, stock, categories and creation date
     - Allows search by product name and description
     - Supports ordering by price and creation date
+    - `?facets=true` wraps the listing as {"results", "facets"} with
+      category, price and availability counts for the filtered products
+    - `?fields=id,name,price` / `?expand=category` return and load only the
+      requested columns (see core/sparse.py)
+    - `<id>/related/` lists products frequently bought together with it
     """
     queryset = (
         Product.objects
@@ -23,23 +40,132 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     # Filtering, Searching, and Ordering setup
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category__slug', 'price', 'stock']
+    filterset_class = ProductFilter
     search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at']
     ordering = ['-created_at']  # Default ordering
 
+    def get_queryset(self):
+        queryset = with_available_stock(super().get_queryset())
+        paths = self.sparse_paths()
+        return queryset if paths is None else restrict_queryset(queryset, paths)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets', '').lower() in ('1', 'true'):
+            facets = product_facets(self.filter_queryset(self.get_queryset()))
+            response.data = {'results': response.data, 'facets': facets}
+        return cache_compressed(response)
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        GET /api/v1/products/batch/?ids=12,7,31
+        Returns {"results": [...]} in request order; unknown ids get a
+        {"id": ..., "detail": "Not found."} marker. Cached products are served
+        from the cache, the rest come from one query. The cache holds full
+        representations; `?fields=` / `?expand=` are applied on the way out.
+        """
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of integers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > settings.PRODUCT_BATCH_MAX_IDS:
+            return Response({"detail": f"Provide between 1 and {settings.PRODUCT_BATCH_MAX_IDS} ids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if self.fieldset is not None:
+            self.get_serializer()  # rejects unknown field names with a 400
+        unique_ids = list(dict.fromkeys(ids))
+        cached = cache.get_many([product_cache_key(pk) for pk in unique_ids])
+        found = {pk: cached[product_cache_key(pk)] for pk in unique_ids if product_cache_key(pk) in cached}
+
+        missing = [pk for pk in unique_ids if pk not in found]
+        if missing:
+            products = with_available_stock(Product.objects.select_related('category')).in_bulk(missing)
+            # Unpruned, so the shared entries stay complete whatever this request asked for
+            context = self.get_serializer_context()
+            fresh = {pk: dict(ProductSerializer(product, context=context).data) for pk, product in products.items()}
+            cache.set_many({product_cache_key(pk): data for pk, data in fresh.items()}, product_cache_timeout())
+            found.update(fresh)
+
+        if self.fieldset is not None:
+            found = {pk: prune_representation(data, *self.fieldset) for pk, data in found.items()}
+        results = [found.get(pk, {"id": pk, "detail": "Not found."}) for pk in ids]
+        return Response({"results": results})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        GET /api/v1/products/<id>/related/
+        Products frequently bought together with this one, strongest first,
+        each with a `bought_together` order count. Precomputed by
+        `manage.py build_recommendations`, so this is one indexed lookup.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        ProductAssociation = apps.get_model('orders', 'ProductAssociation')
+        associations = list(
+            with_available_stock(ProductAssociation.objects.filter(product_id=pk), through='related')
+            .select_related('related__category')
+            .order_by('rank')
+        )
+        if not associations and not Product.objects.filter(pk=pk).exists():
+            raise Http404
+
+        results = []
+        for association in associations:
+            association.related.sharded_stock = association.related_sharded_stock
+            data = dict(self.get_serializer(association.related).data)
+            data['bought_together'] = association.orders
+            results.append(data)
+        return Response({"results": results})
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing product categories.
 
     Uses slug-based lookup for cleaner, SEO-friendly URLs.
+    Product counts are denormalized on the category rows, so listing never
+    touches the products table; unfiltered listings and the tree are cached.
     """
-    queryset = (
-        Category.objects
-        .prefetch_related('products')  # Optimize reverse relationship queries
-        .order_by('name')
-    )
+    queryset = Category.objects.order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
+    filterset_fields = {'parent__slug': ['exact'], 'parent': ['isnull']}
+
+    def list(self, request, *args, **kwargs):
+        # Only the plain listing is cached; filtered variants go to the database
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        data = cache.get(CATEGORY_LIST_KEY)
+        if data is None:
+            data = self.get_serializer(self.get_queryset(), many=True).data
+            cache.set(CATEGORY_LIST_KEY, data, category_cache_timeout())
+        return cache_compressed(Response(data))
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        GET /api/v1/categories/tree/
+        Returns root categories with nested `children`, built from one query.
+        """
+        data = cache.get(CATEGORY_TREE_KEY)
+        if data is None:
+            data = self.build_tree(Category.objects.order_by('path'))
+            cache.set(CATEGORY_TREE_KEY, data, category_cache_timeout())
+        return cache_compressed(Response(data))
+
+    def build_tree(self, categories):
+        """Nest serialized categories under their parents (paths sort parents first)."""
+        nodes, roots = {}, []
+        for category in categories:
+            node = {**self.get_serializer(category).data, 'children': []}
+            nodes[category.pk] = node
+            parent = nodes.get(category.parent_id)
+            (parent['children'] if parent else roots).append(node)
+        return roots
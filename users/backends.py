@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import harden_runtime, verify_password
+
+
+class PooledHashingBackend(ModelBackend):
+    """
+    ModelBackend whose password checks run in the hashing pool (see hashing.py).
+    Hashes made with an outdated hasher or parameters are upgraded on login.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Same cost as a real check, so response times don't reveal which usernames exist
+            harden_runtime(password)
+            return None
+
+        is_correct, upgraded = verify_password(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if upgraded:
+            user.password = upgraded
+            UserModel._default_manager.filter(pk=user.pk).update(password=upgraded)
+        return user
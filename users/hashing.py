@@ -0,0 +1,192 @@
+"""
+Password hashing off the request thread.
+
+PBKDF2 (or Argon2/bcrypt) is deliberately slow CPU work. Running it inline
+lets a signup or login burst occupy every web worker. Here it runs in a
+small per-process pool of hashing processes (`PASSWORD_HASH_WORKERS`), and
+at most `PASSWORD_HASH_MAX_PENDING` hashes may be queued or running at once
+(0: no limit). Beyond that, callers get `HashingBusy` (HTTP 503 with
+Retry-After) instead of piling up; `HashingBusyMiddleware` gives non-DRF
+callers such as the admin login the same 503. A pool whose worker died is
+rebuilt and the hash retried once. `PASSWORD_HASH_WORKERS = 0` hashes inline
+(handy for local runs).
+
+Hashers come from `PASSWORD_HASHERS`, as in Django: the first one is used
+for new hashes, and `verify_password()` returns an upgraded hash when the
+stored one used another hasher or weaker parameters.
+"""
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-in attempts are being processed. Please retry shortly."
+    default_code = "hashing_busy"
+    # DRF's exception handler turns `wait` into a Retry-After header
+    wait = 1
+
+
+# -- Run inside the hashing processes: plain functions, no Django settings needed --
+
+@functools.cache
+def _hashers(hasher_paths):
+    return [import_string(path)() for path in hasher_paths]
+
+
+def _identify(encoded, hashers):
+    """The configured hasher that produced `encoded`, or None (mirrors Django's identify_hasher)."""
+    if (len(encoded) == 32 and "$" not in encoded) or (len(encoded) == 37 and encoded.startswith("md5$$")):
+        algorithm = "unsalted_md5"
+    elif len(encoded) == 46 and encoded.startswith("sha1$$"):
+        algorithm = "unsalted_sha1"
+    else:
+        algorithm = encoded.split("$", 1)[0]
+    return next((hasher for hasher in hashers if hasher.algorithm == algorithm), None)
+
+
+def _encode(password, hasher_paths):
+    hasher = _hashers(hasher_paths)[0]
+    return hasher.encode(password, hasher.salt())
+
+
+def _verify(password, encoded, hasher_paths):
+    """Return (is_correct, upgraded_hash_or_None)."""
+    hashers = _hashers(hasher_paths)
+    hasher = _identify(encoded or "", hashers)
+    if hasher is None or not hasher.verify(password, encoded):
+        return False, None
+    preferred = hashers[0]
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, preferred.encode(password, preferred.salt())
+    return True, None
+
+
+# -- Request side --
+
+class _Pool:
+    """A lazily started process pool plus the semaphore bounding its backlog."""
+
+    def __init__(self, workers, max_pending, start_method):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self.start_method = start_method
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        # A forked web worker must not reuse its parent's executor
+        if self.executor is None or self.pid != os.getpid():
+            with self.lock:
+                if self.executor is None or self.pid != os.getpid():
+                    context = multiprocessing.get_context(self.start_method)
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    self.pid = os.getpid()
+        return self.executor
+
+    def run(self, func, *args):
+        if self.workers == 0:
+            return func(*args)
+        if self.slots is None:
+            return self.submit(func, *args)
+        if not self.slots.acquire(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            raise HashingBusy()
+        try:
+            return self.submit(func, *args)
+        finally:
+            self.slots.release()
+
+    def submit(self, func, *args):
+        executor = self.get_executor()
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A hashing process died (OOM killer, segfault); start a fresh pool and retry once
+            self.discard(executor)
+            return self.get_executor().submit(func, *args).result()
+
+    def discard(self, executor):
+        """Drop `executor` unless another thread has already replaced it."""
+        with self.lock:
+            if self.executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    def shutdown(self):
+        if self.executor is not None and self.pid == os.getpid():
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _Pool(
+                    settings.PASSWORD_HASH_WORKERS,
+                    settings.PASSWORD_HASH_MAX_PENDING,
+                    settings.PASSWORD_HASH_START_METHOD,
+                )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    """Rebuild the pool when tests override its settings."""
+    global _pool
+    if setting.startswith("PASSWORD_HASH") and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def hash_password(password):
+    """Hash `password` with the preferred hasher, off the request thread."""
+    return get_pool().run(_encode, password, tuple(settings.PASSWORD_HASHERS))
+
+
+def verify_password(password, encoded):
+    """Return (is_correct, upgraded_hash_or_None) for `password` against `encoded`."""
+    return get_pool().run(_verify, password, encoded, tuple(settings.PASSWORD_HASHERS))
+
+
+def harden_runtime(password):
+    """Burn one hash's worth of time so unknown usernames can't be told apart by timing."""
+    hash_password(password)
+
+
+class HashingBusyMiddleware:
+    """
+    Turns `HashingBusy` into a 503 for views outside DRF (the admin login),
+    which would otherwise answer with a 500. DRF views handle it themselves.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(str(exception.detail), status=exception.status_code, content_type="text/plain")
+        response["Retry-After"] = str(exception.wait)
+        return response
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .hashing import hash_password
 from .models import CustomUser
 
 
@@ -22,9 +23,14 @@ class UserRegisterSerializer(serializers.ModelSerializer):          # Serializer
         return attrs
 
     def create(self, validated_data):
-        """Create and return a new user instance."""
+        """Create and return a new user instance (the password is hashed in the hashing pool)."""
         validated_data.pop('password2')
-        return CustomUser.objects.create_user(**validated_data)
+        password = validated_data.pop('password')
+        user = CustomUser(**validated_data)
+        user.clean()  # normalizes username and email, as create_user does
+        user.password = hash_password(password)
+        user.save()
+        return user
 
 
 
@@ -1,3 +1,89 @@
-from django.test import TestCase
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from .hashing import get_pool
+from .models import CustomUser
+
+
+FAST_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+]
+
+
+def exit_first_time(marker):
+    """Kill the hashing process on the first call (breaking the pool), succeed afterwards."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "hashed"
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, PASSWORD_HASH_WORKERS=1)
+class PooledHashingTests(APITestCase):
+    """Registration and login hash in the pool, upgrade old hashes, and shed load when full."""
+
+    credentials = {"username": "shopper", "password": "s3cret-pass"}
+
+    def register(self):
+        return self.client.post(reverse("users:register"), {
+            **self.credentials, "email": "Shopper@EXAMPLE.com", "password2": self.credentials["password"],
+        })
+
+    def test_register_then_login(self):
+        self.assertEqual(self.register().status_code, 201)
+        user = CustomUser.objects.get(username="shopper")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        self.assertEqual(user.email, "Shopper@example.com")
+
+        response = self.client.post(reverse("users:token_obtain_pair"), self.credentials)
+        self.assertIn("access", response.data)
+        wrong = {**self.credentials, "password": "nope"}
+        self.assertEqual(self.client.post(reverse("users:token_obtain_pair"), wrong).status_code, 401)
+
+    def test_login_upgrades_legacy_hash(self):
+        legacy = make_password(self.credentials["password"], hasher="md5")
+        CustomUser.objects.create(username="shopper", password=legacy)
+
+        self.assertEqual(self.client.post(reverse("users:token_obtain_pair"), self.credentials).status_code, 200)
+        self.assertTrue(CustomUser.objects.get(username="shopper").password.startswith("pbkdf2_sha256$"))
+
+    def test_full_pool_sheds_load(self):
+        # Every slot taken by hashes in flight: the next caller times out waiting
+        with self.settings(PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.05):
+            slots = get_pool().slots
+            slots.acquire()
+            try:
+                response = self.register()
+            finally:
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_zero_max_pending_is_unbounded(self):
+        with self.settings(PASSWORD_HASH_MAX_PENDING=0):
+            self.assertEqual(self.register().status_code, 201)
+
+    def test_admin_login_gets_503_when_busy(self):
+        CustomUser.objects.create_superuser(username="boss", password="s3cret-pass", email="boss@example.com")
+        with self.settings(PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.05):
+            slots = get_pool().slots
+            slots.acquire()
+            try:
+                response = self.client.post(reverse("admin:login"), {"username": "boss", "password": "s3cret-pass"})
+            finally:
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    @override_settings(PASSWORD_HASH_START_METHOD="fork")
+    def test_broken_pool_is_rebuilt_and_retried(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(get_pool().run(exit_first_time, os.path.join(directory, "died")), "hashed")
+        self.assertEqual(self.register().status_code, 201)